@@ -1,8 +1,9 @@
 import logging
 import os.path
 import sqlite3
+import threading
 import time
-from typing import Any, List, Optional, Set, Union
+from typing import Any, Dict, List, Optional, Set, Union
 
 import qtawesome as qta
 from PySide6.QtCore import QCoreApplication, QFile, Signal
@@ -12,6 +13,7 @@ from PySide6.QtWidgets import QCheckBox, QComboBox, QLineEdit, QPlainTextEdit, Q
 
 from edobot.core import Component, Constants
 from edobot.model import EventType, User, UserType
+from edobot.network import Reactor
 from edobot.services import twitch
 
 __all__ = ["AutoShoutOut"]
@@ -61,6 +63,9 @@ class AutoShoutOut(Component):
     def __init__(self) -> None:
         super().__init__()
         self.widget: Optional[QWidget] = None
+        self.last_shoutouts: Dict[str, float] = {}  # user_id -> time of the last shoutout
+        self.pending_writes: Dict[str, float] = {}
+        self.pending_writes_lock = threading.Lock()
 
     @staticmethod
     def get_id() -> str:
@@ -80,33 +85,30 @@ class AutoShoutOut(Component):
         return None  # To get all the messages without command filtering
 
     def start(self) -> None:
-        self.cooldown_enabled = self.config["cooldown_enabled"].setdefault(True)
-        self.cooldown = self.config["cooldown"].setdefault(90)
-        self.cooldown_format = self.config["cooldown_format"].setdefault("minutes")
-        self.blacklist = self.config["blacklist"].setdefault([])
-        self.blacklist_enabled = self.config["blacklist_enabled"].setdefault(True)
-        self.whitelist = self.config["whitelist"].setdefault([])
-        self.whitelist_enabled = self.config["whitelist_enabled"].setdefault(False)
-        self.message = self.config["message"].setdefault("")
-        self.message_alt = self.config["message_alt"].setdefault("")
-        self.raids_enabled = self.config["raids_enabled"].setdefault(True)
-        self.raid_min_viewers = self.config["raid_min_viewers"].setdefault(2)
-        self.affiliate_enabled = self.config["affiliate_enabled"].setdefault(True)
-        self.partner_enabled = self.config["partner_enabled"].setdefault(True)
-
-        self.so_database_path = os.path.join(Constants.TMP_DIRECTORY, "shoutouts.db")
-
-        # Create database table
-        if not os.path.isfile(self.so_database_path):
-            database = sqlite3.connect(self.so_database_path)
-            cur = database.cursor()
-            cur.execute("CREATE TABLE shoutouts(user_id text, time real)")
-            database.commit()
-            database.close()
+        with self.config.batch():  # The defaults are written once
+            self.cooldown_enabled = self.config["cooldown_enabled"].setdefault(True)
+            self.cooldown = self.config["cooldown"].setdefault(90)
+            self.cooldown_format = self.config["cooldown_format"].setdefault("minutes")
+            self.blacklist = self.config["blacklist"].setdefault([])
+            self.blacklist_enabled = self.config["blacklist_enabled"].setdefault(True)
+            self.whitelist = self.config["whitelist"].setdefault([])
+            self.whitelist_enabled = self.config["whitelist_enabled"].setdefault(False)
+            self.message = self.config["message"].setdefault("")
+            self.message_alt = self.config["message_alt"].setdefault("")
+            self.raids_enabled = self.config["raids_enabled"].setdefault(True)
+            self.raid_min_viewers = self.config["raid_min_viewers"].setdefault(2)
+            self.affiliate_enabled = self.config["affiliate_enabled"].setdefault(True)
+            self.partner_enabled = self.config["partner_enabled"].setdefault(True)
+
+        self.own_login = self.twitch.get_user().login
+        self.shoutouts = self.storage.table("shoutouts")
+        self.import_legacy_shoutouts()
+        self.last_shoutouts = dict(self.shoutouts.items())
 
         super().start()
 
     def stop(self) -> None:
+        self.flush_shoutout_times()
         super().stop()
 
     def process_message(
@@ -188,11 +190,19 @@ class AutoShoutOut(Component):
 
     # Shoutouts
     def process_shoutout(self, user: User):
+        # The cooldown is checked first, it only needs the id from the chat tags, while reading the broadcaster
+        # type of a chat user may request it from Twitch
+        current_time = time.time()
+        last_shoutout_time = self.get_last_shoutout_time(user.id)
+        if last_shoutout_time is not None:
+            if not self.cooldown_enabled or (current_time - last_shoutout_time) <= self.get_cooldown_seconds():
+                return
+
         if (
             self.blacklist_enabled
             and user.login in self.blacklist
             or user.login in self.BotBlacklist
-            or user.login == self.twitch.get_user().login
+            or user.login == self.own_login
         ):
             return
 
@@ -202,23 +212,9 @@ class AutoShoutOut(Component):
         if self.partner_enabled:
             broadcaster_types_to_check.append("partner")
 
-        if user.broadcaster_type in broadcaster_types_to_check or (
-            self.whitelist_enabled and user.login in self.whitelist
+        if (self.whitelist_enabled and user.login in self.whitelist) or (
+            broadcaster_types_to_check and user.broadcaster_type in broadcaster_types_to_check
         ):
-            current_time = time.time()
-
-            if self.cooldown_format == "hours":
-                cooldown_time = self.cooldown * 3600
-            elif self.cooldown_format == "minutes":
-                cooldown_time = self.cooldown * 60
-            else:
-                cooldown_time = self.cooldown
-
-            last_shoutout_time = self.get_last_shoutout_time(user.id)
-            if last_shoutout_time is not None:
-                if not self.cooldown_enabled or (current_time - last_shoutout_time) <= cooldown_time:
-                    return
-
             channel = self.twitch.get_channel(user.id)
             if channel is not None:
                 for message in (self.message, self.message_alt):
@@ -229,23 +225,55 @@ class AutoShoutOut(Component):
                         self.chat.send_message(final_message)
                         self.store_last_shoutout_time(user.id, current_time)
 
+    def get_cooldown_seconds(self) -> float:
+        if self.cooldown_format == "hours":
+            return self.cooldown * 3600
+        elif self.cooldown_format == "minutes":
+            return self.cooldown * 60
+        return self.cooldown
+
     # Database
+    def import_legacy_shoutouts(self) -> None:
+        """Moves the shoutout times of the previous database file to the storage, only once"""
+        legacy_path = os.path.join(Constants.TMP_DIRECTORY, "shoutouts.db")
+        if not os.path.isfile(legacy_path):
+            return
+        try:
+            database = sqlite3.connect(legacy_path)
+            try:
+                rows = database.execute("SELECT user_id, time FROM shoutouts").fetchall()
+            finally:
+                database.close()
+            with self.shoutouts.batch():
+                current = dict(self.shoutouts.items())
+                self.shoutouts.set_many(
+                    {str(user_id): time for user_id, time in rows if time > current.get(str(user_id), 0)}
+                )
+            os.replace(legacy_path, f"{legacy_path}.migrated")
+            gLogger.info(f"Imported {len(rows)} shoutout times from '{legacy_path}'")
+        except (sqlite3.Error, OSError) as e:
+            gLogger.error(f"Error importing the shoutout times from '{legacy_path}': {e}")
+
     def get_last_shoutout_time(self, user_id: str) -> Optional[float]:
-        database = sqlite3.connect(self.so_database_path)
-        cur = database.cursor()
-        users = list(cur.execute(f"SELECT * FROM shoutouts WHERE user_id = '{user_id}'"))
-        database.close()
-        return users[0][1] if len(users) > 0 else None
+        return self.last_shoutouts.get(user_id)
 
     def store_last_shoutout_time(self, user_id: str, time: float):
-        database = sqlite3.connect(self.so_database_path)
-        cur = database.cursor()
-        if self.get_last_shoutout_time(user_id) is None:
-            cur.execute(f"INSERT INTO shoutouts VALUES ({user_id}, {time})")
-        else:
-            cur.execute(f"UPDATE shoutouts SET time = {time} WHERE user_id = '{user_id}'")
-        database.commit()
-        database.close()
+        """Updates the in-memory index, the write to the database happens later in the reactor executor"""
+        self.last_shoutouts[user_id] = time
+        with self.pending_writes_lock:
+            flush_scheduled = bool(self.pending_writes)
+            self.pending_writes[user_id] = time
+        if not flush_scheduled:
+            Reactor.shared().run_in_executor(self.flush_shoutout_times)
+
+    def flush_shoutout_times(self) -> None:
+        with self.pending_writes_lock:
+            pending_writes, self.pending_writes = self.pending_writes, {}
+        if pending_writes:
+            try:
+                self.shoutouts.set_many(pending_writes)
+            except Exception as e:
+                gLogger.error(f"Error storing the shoutout times: {e}")
 
     # Slots
     def cooldown_enabled_changed(self, state: int):
@@ -28,6 +28,7 @@ from PySide6.QtWidgets import (
 
 from edobot.core import Component
 from edobot.model import EventType, User, UserType
+from edobot.services.twitch import MessagePriority
 
 __all__ = ["CommandsComponent"]
 
@@ -289,7 +290,7 @@ class CommandsComponent(Component):  # TODO: Change to chat store
                     ):
                         self.cooldown_times[command] = current_time + (cmd["cooldown"] * 1000)
                         self.user_cooldown_times[user.login][command] = current_time + (cmd["user_cooldown"] * 1000)
-                        self.chat.send_message(cmd["response"])
+                        self.chat.send_message(cmd["response"], MessagePriority.HIGH)
                     # else:
                     #     if global_cooldown_time:
                     #         print("Global cooldown:", global_cooldown_time - current_time)
@@ -134,7 +134,7 @@ class CountdownTimerComponent(Component):
                     elif event_type == EventType.BITS:
                         bits_event: twitch.events.BitsEvent = metadata
                         events = timer.get_events(event_type)
-                        nbits = bits_event.total_bits_used
+                        nbits = bits_event.bits_used
                         for event in events:
                             if event.enabled:
                                 if event.data["is_exact"]:
@@ -414,7 +414,8 @@ class CountdownTimerWidget(QWidget):
                     lambda key, val: self.update_active_event_data(key, val, True)
                 )
                 self.event_config_layout.insertWidget(0, widget)
-                widget.set_values(event.data)
+                with self.data_parent.config.batch():  # Each value set emits valueChanged, which saves the timers
+                    widget.set_values(event.data)
 
     def update_active_event_data(self, name: str, data: Any, is_custom=False):
         selected_item: QListWidgetItem = self.active_events_list.selectedItems()[0]
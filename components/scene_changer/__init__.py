@@ -232,6 +232,7 @@ class SceneChangerComponent(Component):
     def set_command(self, command: str):
         self.command = command
         self.config["command"] = self.command
+        self.notify_command_changed()
 
     def update_who_can(self, editor: bool, mod: bool, vip: bool, sub: bool, chatter: bool):
         self.who_can = set()
@@ -0,0 +1,80 @@
+"""Compares the IRC line parser used by Chat against the previous find/rsplit based parsing"""
+
+import argparse
+import os
+import sys
+import timeit
+from typing import Mapping
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+import edobot.core  # noqa: E402, F401  Loaded before the twitch service, they import each other
+from edobot.services.twitch.chat import Chat  # noqa: E402
+from edobot.services.twitch.irc_parser import parse_irc_line  # noqa: E402
+
+######################################################################
+
+parser = argparse.ArgumentParser()
+parser.add_argument("-n", "--number", help="Number of times to parse the sample", type=int, default=2000)
+args = parser.parse_args()
+
+######################################################################
+
+SAMPLE = [
+    "@badge-info=subscriber/8;badges=subscriber/6,premium/1;client-nonce=1b2c3d;color=#0D4200;"
+    "display-name=Viewer;emotes=25:0-4,12-16/1902:6-10;first-msg=0;flags=;id=b34ccfc7-4977-403a-8a94-33c6bac34fb8;"
+    "mod=0;returning-chatter=0;room-id=1337;subscriber=1;tmi-sent-ts=1507246572675;turbo=0;user-id=1337;"
+    "user-type= :viewer!viewer@viewer.tmi.twitch.tv PRIVMSG #channel :Kappa Keepo Kappa",
+    "@badge-info=;badges=moderator/1;color=;display-name=Mod;emotes=;flags=;id=1;mod=1;room-id=1337;"
+    "tmi-sent-ts=1507246572675;user-id=42;user-type=mod :mod!mod@mod.tmi.twitch.tv PRIVMSG #channel :!so PRIVMSG",
+    ":viewer!viewer@viewer.tmi.twitch.tv JOIN #channel",
+    ":viewer!viewer@viewer.tmi.twitch.tv PART #channel",
+    ":bot.tmi.twitch.tv 353 bot = #channel :viewer1 viewer2 viewer3 viewer4",
+    "PING :tmi.twitch.tv",
+]
+
+
+def legacy_parse(lines) -> int:
+    """Parsing done by Chat.handle_message before the IRC parser"""
+
+    def process_tags(tags_raw: str) -> Mapping[str, str]:
+        tags_dict = {}
+        for key_value in tags_raw.lstrip("@").split(";"):
+            key, value = key_value.split("=", 1)
+            if key not in ["subscriber", "turbo", "user-type"]:
+                tags_dict[key.replace("-", "_")] = value
+        return tags_dict
+
+    parsed = 0
+    for line in lines:
+        if line.find("PRIVMSG") > 0:
+            raw_message_list = line.rsplit("PRIVMSG", 1)
+            tags_raw, sender_raw = raw_message_list[0].strip(" ").rsplit(" ", 1)
+            process_tags(tags_raw)
+            sender_raw.split("!")[0].lstrip(":")
+            raw_message_list[1].split(":", 1)
+            parsed += 1
+        elif line.find("USERNOTICE") > 0:
+            process_tags(line.rsplit("USERNOTICE", 1)[0])
+            parsed += 1
+        elif line.startswith("PING"):
+            line.split(" ")[1]
+            parsed += 1
+    return parsed
+
+
+def new_parse(lines) -> int:
+    parsed = 0
+    for line in lines:
+        message = parse_irc_line(line, Chat.IGNORED_COMMANDS)
+        if message is None:
+            continue
+        if message.command in ("PRIVMSG", "USERNOTICE"):
+            message.tags
+        parsed += 1
+    return parsed
+
+
+for name, function in (("legacy", legacy_parse), ("parse_irc_line", new_parse)):
+    seconds = timeit.timeit(lambda: function(SAMPLE), number=args.number)
+    print(f"{name:>16}: {len(SAMPLE) * args.number / seconds:,.0f} lines/s")
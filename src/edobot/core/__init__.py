@@ -1,5 +1,8 @@
 from .app import *  # noqa: F403
 from .component import Component  # noqa: F401
+from .component_worker import *  # noqa: F403
 from .config import *  # noqa: F403
 from .constants import *  # noqa: F403
 from .data_base import *  # noqa: F403
+from .event_bus import *  # noqa: F403
+from .storage import *  # noqa: F403
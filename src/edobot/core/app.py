@@ -1,3 +1,4 @@
+import asyncio
 import importlib
 import importlib.util
 import inspect
@@ -12,16 +13,21 @@ import traceback
 from concurrent.futures import ThreadPoolExecutor
 from functools import partial
 from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
-from typing import Any, Callable, List, Mapping, MutableMapping, Optional, Set, Type
+from typing import Any, Callable, Hashable, List, Mapping, MutableMapping, Optional, Set, Tuple, Type
 
 from edobot import model
+from edobot.network import AsyncioReactor, Reactor
+from edobot.network.http_session import HTTPSession
 from edobot.obs import OBSInterface, OBSWebSocket, StreamlabsOBS
 from edobot.services import twitch
 
 from .component import Component
+from .component_worker import AsyncComponentWorker, ComponentWorker, OverflowPolicy, stop_workers
 from .config import Config
 from .constants import Constants
-from .data_base import DataBase
+from .data_base import DataBase, SQLiteDatabase
+from .event_bus import BusEvent, EventBus, EventSource
+from .storage import Storage
 
 __all__ = ["App"]
 
@@ -67,18 +73,52 @@ class TokenRedirectWebServer(threading.Thread):
             self.httpd.shutdown()
 
 
+class PeriodicTaskThread(threading.Thread):
+    def __init__(self, name: str, interval_seconds: float, task: Callable[[], None]) -> None:
+        super().__init__(name=f"{name}Thread", daemon=True)
+        self.interval_seconds = interval_seconds
+        self.task = task
+        self.stop_event = threading.Event()
+
+    def run(self) -> None:
+        while not self.stop_event.wait(self.interval_seconds):
+            try:
+                self.task()
+            except Exception as e:
+                gLogger.error(f"Error running periodic task '{self.name}': {e}")
+
+    def stop(self) -> None:
+        self.stop_event.set()
+        if self.is_alive():
+            self.join()
+
+
 class App:
+    DISPATCH_QUEUE_SIZE = 1024
+
     def __init__(self):
         self.is_running = False
         self.has_started = False
         self.config = Config(os.path.join(Constants.CONFIG_DIRECTORY, "settings.json"))
         self.start_stop_lock = threading.Lock()
 
+        # "threads" keeps the selector reactor, "asyncio" runs the connections and async components in one event loop.
+        # It's installed before any config write, the writes are flushed through the reactor and would start the default
+        self.runtime = self.config["runtime"].get("threads")
+        self.async_reactor: Optional[AsyncioReactor] = None
+        if self.runtime == "asyncio":
+            reactor = AsyncioReactor()
+            if Reactor.install(reactor):
+                self.async_reactor = reactor
+            else:
+                gLogger.warning("The reactor was already running, the asyncio runtime is not available")
+
         os.makedirs(Constants.TMP_DIRECTORY, exist_ok=True)
 
         self.host_twitch_service: twitch.Service | None = None
         self.bot_twitch_service: twitch.Service | None = None
         self.db = DataBase(Constants.SAVE_DIRECTORY)
+        self.components_db = SQLiteDatabase.open(os.path.join(Constants.SAVE_DIRECTORY, "components.sqlite3"))
 
         self.chat_service = None
         self.pubsub_service = None
@@ -87,7 +127,13 @@ class App:
         self.available_components_folders: MutableMapping[str, Optional[str]] = {}
         self.failed_components: List[str] = []
         self.active_components: MutableMapping[str, Component] = {}
-        self.components_lock = threading.Lock()
+        self.components_lock = threading.RLock()
+        # lower-cased command -> (component, wants_full_text) pairs in activation order, catch-all ones included
+        self.command_index: MutableMapping[str, List[Tuple[Component, bool]]] = {}
+        self.catch_all_components: List[Tuple[Component, bool]] = []
+        self.component_workers: MutableMapping[str, ComponentWorker | AsyncComponentWorker] = {}
+        # Classifies the chat messages and routes them and the events to the components, off the reactor thread
+        self.dispatcher: Optional[ComponentWorker] = None
         self.update_available_components()
 
         self.host_scope = [
@@ -105,6 +151,7 @@ class App:
         self.bot_scope.sort()
 
         self.executor: Optional[ThreadPoolExecutor] = None
+        self.cache_snapshot_thread: Optional[PeriodicTaskThread] = None
 
         self.token_web_server: Optional[TokenRedirectWebServer] = None
 
@@ -124,6 +171,36 @@ class App:
         self.config["obswebsocket"].setdefault({"host": "localhost", "port": 4455, "password": "changeme"})
         self.config["slobs"].setdefault({"host": "localhost", "port": 59650, "token": ""})
 
+        self.twitch_cache_config = self.config["twitch_cache"].setdefault(
+            {"max_cached_users": 10000, "max_cached_channels": 1000, "cache_max_bytes": 16 * 1024 * 1024}
+        )
+
+        event_bus_config = self.config["event_bus"].setdefault({"dedup_window": 120, "max_tracked_events": 4096})
+        self.event_bus = EventBus(event_bus_config["dedup_window"], event_bus_config["max_tracked_events"])
+        self.event_bus.subscribe(self.handle_bus_event)
+
+        # EventSub delivers every event PubSub does, the PubSub connection is only kept as a fallback
+        self.pubsub_enabled: bool = self.config["pubsub_enabled"].setdefault(True)
+
+        self.chat_config = self.config["chat"].setdefault({"verified_bot": False})
+
+        self.cache_snapshot_config = self.config["cache_snapshot"].setdefault({"enabled": True, "interval": 300})
+
+        self.config["runtime"].setdefault(self.runtime)
+
+        http_pool_config = self.config["http_pool"].setdefault({"pool_connections": 4, "pool_maxsize": 10})
+        HTTPSession.shared().configure(http_pool_config["pool_connections"], http_pool_config["pool_maxsize"])
+
+        component_queue_config = self.config["component_queue"].setdefault(
+            {"size": 256, "overflow_policy": OverflowPolicy.DROP_OLDEST.value}
+        )
+        self.component_queue_size: int = component_queue_config.get("size", 256)
+        try:
+            self.component_queue_policy = OverflowPolicy(component_queue_config.get("overflow_policy"))
+        except ValueError:
+            gLogger.warning(f"Invalid component queue overflow policy, using '{OverflowPolicy.DROP_OLDEST.value}'")
+            self.component_queue_policy = OverflowPolicy.DROP_OLDEST
+
         # Load the components and remove the repeated items mantaining the order
         seen = set()
         self.current_components = [x for x in self.current_components if not (x in seen or seen.add(x))]
@@ -145,18 +222,36 @@ class App:
 
     def token_received(self, token: model.AccessToken):
         if token.state[0] == "host":
-            self.host_twitch_service = twitch.Service(token)
+            self.host_twitch_service = self.__create_twitch_service(token)
             if self.host_connected:
                 self.host_connected(self.host_twitch_service.get_user())
         elif token.state[0] == "bot":
-            self.bot_twitch_service = twitch.Service(token)
+            self.bot_twitch_service = self.__create_twitch_service(token)
             if self.bot_connected:
                 self.bot_connected(self.bot_twitch_service.get_user())
         self.db.set_user_token(token.state[0], token)
         if self.host_twitch_service is not None and self.bot_twitch_service is not None:
             self.__stop_token_web_server()
 
-    def handle_message(self, sender: str, tags: twitch.PrivateMsgTags, text: str) -> None:
+    def handle_message(self, sender: str, tags: twitch.PrivateMsgTags, text: str) -> None:  # Runs in the reactor
+        dispatcher = self.dispatcher
+        if dispatcher is not None:
+            dispatcher.submit(partial(self.__secure_dispatch, self.__process_message, sender, tags, text))
+
+    def handle_bus_event(self, event: BusEvent) -> None:  # Runs in the reactor
+        dispatcher = self.dispatcher
+        if dispatcher is not None:
+            dispatcher.submit(partial(self.__secure_dispatch, self.handle_event, event.type, event.metadata))
+
+    def handle_event(self, event_type: model.EventType, metadata: Any):
+        if self.host_twitch_service is None or self.bot_twitch_service is None:
+            return
+        with self.components_lock:
+            for component in self.active_components.values():
+                self.__dispatch_to_component(component, None, "process_event", event_type, metadata)
+
+    def __process_message(self, sender: str, tags: twitch.PrivateMsgTags, text: str) -> None:
+        # Classifying the user may call Helix and the component queues may block, so it runs in the dispatcher
         if self.host_twitch_service is None or self.bot_twitch_service is None:
             return
 
@@ -168,16 +263,18 @@ class App:
             user_types.add(model.UserType.MODERATOR)
             user_types.add(model.UserType.VIP)
 
-        user = self.host_twitch_service.get_user(sender)
-
-        if user is None:
-            gLogger.warning(f"User '{sender}' could not be found")
-            return
+        # The Helix only fields are requested the first time a component needs them
+        user = model.LazyUser(
+            id=tags.user_id,
+            login=sender,
+            display_name=tags.display_name,
+            loader=partial(self.host_twitch_service.get_user, sender),
+        )
 
         if tags.mod:
             user_types.add(model.UserType.MODERATOR)
 
-        if "vip" in tags.badges:
+        if tags.has_badge("vip"):
             user_types.add(model.UserType.VIP)
 
         if model.UserType.VIP in user_types or model.UserType.MODERATOR in user_types:
@@ -186,31 +283,34 @@ class App:
                 if editor.user_id == user.id:
                     user_types.add(model.UserType.EDITOR)
 
-        if "subscriber" in tags.badges:
+        if tags.has_badge("subscriber"):
             user_types.add(model.UserType.SUBSCRIPTOR)
 
-        is_command = text.startswith("!")
-        with self.components_lock:
-            for component in self.active_components.values():
-                comp_command = component.get_command()
-                if comp_command is not None:
-                    if is_command:
-                        command_pack = text.lstrip("!").split(" ", 1)
-                        command = command_pack[0]
-                        message = command_pack[1] if len(command_pack) > 1 else ""
-                        if (isinstance(comp_command, str) and command.lower() == comp_command.lower()) or (
-                            isinstance(comp_command, list) and command in comp_command
-                        ):
-                            self.__secure_component_method_call(component, "process_message", message, user, user_types)
-                else:
-                    self.__secure_component_method_call(component, "process_message", text, user, user_types)
+        if text.startswith("!"):
+            command_pack = text.lstrip("!").split(" ", 1)
+            command = command_pack[0].lower()
+            message = command_pack[1] if len(command_pack) > 1 else ""
+        else:
+            command = None
+            message = text
 
-    def handle_event(self, event_type: model.EventType, metadata: Any):
-        if self.host_twitch_service is None or self.bot_twitch_service is None:
-            return
         with self.components_lock:
-            for component in self.active_components.values():
-                self.__secure_component_method_call(component, "process_event", event_type, metadata)
+            routes = self.catch_all_components
+            if command is not None:
+                routes = self.command_index.get(command, routes)
+            for component, wants_full_text in routes:
+                component_text = text if wants_full_text else message
+                self.__dispatch_to_component(
+                    component, (sender, component_text), "process_message", component_text, user, user_types
+                )
+
+    @staticmethod
+    def __secure_dispatch(task: Callable[..., None], *args: Any) -> None:
+        try:
+            task(*args)
+        except Exception as e:
+            traceback_str = "".join(traceback.format_tb(e.__traceback__))
+            gLogger.error(f"Error dispatching to the components: {e}\n{traceback_str}")
 
     #################################################################
     # Public
@@ -247,6 +347,10 @@ class App:
     def get_active_components(self) -> Mapping[str, Component]:
         return self.active_components
 
+    def get_component_queue_depths(self) -> Mapping[str, int]:
+        with self.components_lock:
+            return {component_id: worker.depth() for component_id, worker in self.component_workers.items()}
+
     def set_obs_choice(self, choice: str) -> None:
         self.obs_choice = choice
 
@@ -346,6 +450,7 @@ class App:
             return
         with self.components_lock:
             self.active_components[component_id] = instance
+            instance.command_changed = self.update_command_index
             if component_id not in self.current_components:
                 self.current_components += [component_id]
                 self.config["components"] = self.current_components
@@ -357,25 +462,56 @@ class App:
                     obs=self.obs_client,
                     chat=self.chat_service,
                     twitch=self.host_twitch_service,
+                    storage=self.__get_component_storage(instance.get_id()),
                 )
                 succeded = self.__secure_component_method_call(instance, "start")
                 if not succeded:
                     self.__secure_component_method_call(instance, "stop")
+                self.__start_component_worker(instance)
+                self.update_command_index()
             return instance
 
     def remove_component(self, component_id: str) -> None:
         with self.components_lock:
-            component = self.active_components[component_id]
-            self.__secure_component_method_call(component, "stop")
+            component = self.active_components.pop(component_id)
+            worker = self.component_workers.pop(component.get_id(), None)
             gLogger.info(
                 f"Removing component '{component.get_metadata().name}' with class name "
                 f"'{component.__class__.__name__}'."
             )
             self.current_components.remove(component_id)
             self.config["components"] = self.current_components
-            if self.component_removed:
-                self.component_removed(self.active_components[component_id])
-            del self.active_components[component_id]
+            if self.has_started:
+                self.update_command_index()
+        # Drained outside the lock, the other components keep receiving messages in the meantime
+        if worker is not None:
+            worker.stop()
+        self.__secure_component_method_call(component, "stop")
+        if self.component_removed:
+            self.component_removed(component)
+
+    def update_command_index(self) -> None:
+        """Rebuild the command routing table, must be called whenever a component changes its command."""
+        with self.components_lock:
+            command_index: MutableMapping[str, List[Tuple[Component, bool]]] = {}
+            catch_all_components: List[Tuple[Component, bool]] = []
+            for component in self.active_components.values():
+                try:
+                    comp_command = component.get_command()
+                except Exception as e:
+                    gLogger.error(f"Error getting command of component '{component.get_metadata().name}': {e}")
+                    continue
+                if comp_command is None:
+                    catch_all_components.append((component, True))
+                    for routes in command_index.values():
+                        routes.append((component, True))
+                    continue
+                for command in [comp_command] if isinstance(comp_command, str) else comp_command:
+                    routes = command_index.setdefault(command.lower(), list(catch_all_components))
+                    if (component, False) not in routes:
+                        routes.append((component, False))
+            self.command_index = command_index
+            self.catch_all_components = catch_all_components
 
     def start(self):
         def __run(self: App):
@@ -394,7 +530,7 @@ class App:
 
             if self.is_running and host_token is not None and host_token.scope == self.host_scope:
                 try:
-                    self.host_twitch_service = twitch.Service(host_token)
+                    self.host_twitch_service = self.__create_twitch_service(host_token)
                     if self.host_connected:
                         self.host_connected(self.host_twitch_service.get_user())
                 except twitch.service.UnauthenticatedException:
@@ -404,7 +540,7 @@ class App:
 
             if self.is_running and bot_token is not None and bot_token.scope == self.bot_scope:
                 try:
-                    self.bot_twitch_service = twitch.Service(bot_token)
+                    self.bot_twitch_service = self.__create_twitch_service(bot_token)
                     if self.bot_connected:
                         self.bot_connected(self.bot_twitch_service.get_user())
                 except twitch.service.UnauthenticatedException:
@@ -429,10 +565,12 @@ class App:
                     self.bot_twitch_service.get_user().display_name,
                     self.bot_twitch_service.token.access_token,
                     self.host_twitch_service.get_user().login,
+                    verified=self.chat_config.get("verified_bot", False),
                 )
-                self.pubsub_service = twitch.PubSub(
-                    self.host_twitch_service.get_user().id, self.host_twitch_service.token.access_token
-                )
+                if self.pubsub_enabled:
+                    self.pubsub_service = twitch.PubSub(
+                        self.host_twitch_service.get_user().id, self.host_twitch_service.token.access_token
+                    )
                 self.eventsub_service = twitch.EventSub(
                     self.host_twitch_service.get_user().id, self.host_twitch_service
                 )
@@ -444,20 +582,26 @@ class App:
                             obs=self.obs_client,
                             chat=self.chat_service,
                             twitch=self.host_twitch_service,
+                            storage=self.__get_component_storage(instance.get_id()),
                         )
                         succeded = self.__secure_component_method_call(instance, "start")
                         if not succeded:
                             self.__secure_component_method_call(instance, "stop")
+                        self.__start_component_worker(instance)
+                    self.update_command_index()
 
                 gLogger.info("Bot started")
 
+            self.dispatcher = ComponentWorker("ChatDispatch", App.DISPATCH_QUEUE_SIZE, OverflowPolicy.DROP_OLDEST)
+            self.dispatcher.start()
             self.chat_service.start()
             self.chat_service.subscribe(self.handle_message)
-            self.chat_service.subscribe_events(self.handle_event)
-            self.pubsub_service.start()
-            self.pubsub_service.subscribe(self.handle_event)
+            self.chat_service.subscribe_events(self.event_bus.publisher(EventSource.IRC))
+            if self.pubsub_service is not None:
+                self.pubsub_service.start()
+                self.pubsub_service.subscribe(self.event_bus.publisher(EventSource.PUBSUB))
             self.eventsub_service.start()
-            self.eventsub_service.subscribe(self.handle_event)
+            self.eventsub_service.subscribe(self.event_bus.publisher(EventSource.EVENTSUB))
 
             self.has_started = True
             if self.started:
@@ -469,6 +613,11 @@ class App:
                 return
             self.is_running = True
             self.executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="AppWorker")
+            if self.cache_snapshot_config.get("enabled", True):
+                self.cache_snapshot_thread = PeriodicTaskThread(
+                    "CacheSnapshot", self.cache_snapshot_config.get("interval", 300), self.__save_twitch_caches
+                )
+                self.cache_snapshot_thread.start()
             gLogger.info(f"Starting {Constants.APP_NAME} ({Constants.APP_VERSION}), please wait...")
             self.executor.submit(__run, self)
 
@@ -479,12 +628,25 @@ class App:
             self.is_running = False
             if self.executor is not None:
                 self.executor.shutdown(wait=True)
+            if self.cache_snapshot_thread is not None:
+                self.cache_snapshot_thread.stop()
+                self.cache_snapshot_thread = None
             if self.has_started:
                 gLogger.info("Stopping bot, please wait...")
+                if self.dispatcher is not None:
+                    self.dispatcher.stop()  # Routes what is already queued before the components stop
+                    self.dispatcher = None
                 with self.components_lock:
-                    for component in self.active_components.values():
-                        self.__secure_component_method_call(component, "stop")
+                    components = list(self.active_components.values())
+                    workers = list(self.component_workers.values())
+                    self.component_workers.clear()
                     self.active_components.clear()
+                    self.command_index = {}
+                    self.catch_all_components = []
+                # The workers drain in parallel and outside the lock, the caller waits for one timeout at most
+                stop_workers(workers)
+                for component in components:
+                    self.__secure_component_method_call(component, "stop")
                 if self.chat_service is not None:
                     self.chat_service.stop()
                 if self.pubsub_service is not None:
@@ -503,6 +665,7 @@ class App:
         if not self.is_running:
             return
         self.config["components"] = self.current_components
+        self.__save_twitch_caches()
         if self.bot_twitch_service is not None:
             self.bot_twitch_service.stop_()
             self.bot_twitch_service = None
@@ -514,6 +677,9 @@ class App:
             gLogger.info("Shutting down bot, please wait...")
             self.obs_client.disconnect()
             self.__stop_token_web_server()
+            Config.flush_all()
+            self.components_db.close()
+            self.db.database.close()
             gLogger.info("Bot shut down")
 
     #################################################################
@@ -530,6 +696,61 @@ class App:
             self.token_web_server.stop()
             self.token_web_server = None
 
+    def __create_twitch_service(self, token: model.AccessToken) -> twitch.Service:
+        service = twitch.Service(token, **self.twitch_cache_config)
+        # Warm start the caches so the first messages after a restart don't need to reach Helix
+        if self.cache_snapshot_config.get("enabled", True):
+            snapshot_file = self.__get_twitch_cache_file(token.state[0])
+            try:
+                with open(snapshot_file, "r", encoding="utf-8") as f:
+                    if service.import_cache(json.load(f)):
+                        gLogger.info(f"Loaded Twitch cache snapshot for '{token.state[0]}'")
+            except FileNotFoundError:
+                pass
+            except (OSError, ValueError) as e:
+                gLogger.warning(f"Error loading Twitch cache snapshot '{snapshot_file}': {e}")
+        return service
+
+    def __save_twitch_caches(self) -> None:
+        for service in (self.host_twitch_service, self.bot_twitch_service):
+            if service is None:
+                continue
+            snapshot_file = self.__get_twitch_cache_file(service.token.state[0])
+            try:
+                os.makedirs(os.path.dirname(snapshot_file), exist_ok=True)
+                with open(f"{snapshot_file}.tmp", "w", encoding="utf-8") as f:
+                    json.dump(service.export_cache(), f)
+                os.replace(f"{snapshot_file}.tmp", snapshot_file)
+            except OSError as e:
+                gLogger.warning(f"Error saving Twitch cache snapshot '{snapshot_file}': {e}")
+
+    @staticmethod
+    def __get_twitch_cache_file(account: str) -> str:
+        return os.path.join(Constants.SAVE_DIRECTORY, "cache", f"twitch_{account}.json")
+
+    def __start_component_worker(self, component: Component) -> None:
+        name = component.__class__.__name__
+        worker: ComponentWorker | AsyncComponentWorker
+        if self.async_reactor is not None and component.is_async():
+            worker = AsyncComponentWorker(
+                name, self.async_reactor.loop, self.component_queue_size, self.component_queue_policy
+            )
+        else:
+            worker = ComponentWorker(name, self.component_queue_size, self.component_queue_policy)
+        self.component_workers[component.get_id()] = worker
+        worker.start()
+
+    def __dispatch_to_component(
+        self, component: Component, coalesce_key: Optional[Hashable], method_name: str, *args: Any
+    ) -> None:
+        worker = self.component_workers.get(component.get_id())
+        if worker is None:
+            return
+        if isinstance(worker, AsyncComponentWorker):
+            worker.submit(partial(self.__secure_component_coroutine_call, component, method_name, *args), coalesce_key)
+        else:
+            worker.submit(partial(self.__secure_component_method_call, component, method_name, *args), coalesce_key)
+
     @staticmethod
     def __get_auth_url(scope: List[str], state: str, force_verify=True) -> str:
         return (
@@ -547,11 +768,31 @@ class App:
         component_config_file = os.path.join(Constants.CONFIG_DIRECTORY, "components", f"{component_id}.json")
         return Config(component_config_file)
 
+    def __get_component_storage(self, component_id: str) -> Storage:
+        return Storage(self.components_db, component_id)
+
     @staticmethod
     def __secure_component_method_call(component: Component, method_name: str, *args: Any, **kwargs: Any) -> bool:
         try:
             method = getattr(component, method_name)
-            method(*args, **kwargs)
+            result = method(*args, **kwargs)
+            if inspect.isawaitable(result):  # Async handler without the asyncio runtime
+                asyncio.run(result)
+            return True
+        except Exception as e:
+            traceback_str = "".join(traceback.format_tb(e.__traceback__))
+            gLogger.error(f"Error in component '{component.get_metadata().name}': {e}\n{traceback_str}")
+        return False
+
+    @staticmethod
+    async def __secure_component_coroutine_call(
+        component: Component, method_name: str, *args: Any, **kwargs: Any
+    ) -> bool:
+        try:
+            method = getattr(component, method_name)
+            result = method(*args, **kwargs)
+            if inspect.isawaitable(result):
+                await result
             return True
         except Exception as e:
             traceback_str = "".join(traceback.format_tb(e.__traceback__))
@@ -1,11 +1,15 @@
+import asyncio
+import inspect
 from abc import ABC, abstractmethod
-from typing import Any, List, Set, Union, final
+from functools import partial
+from typing import Any, Callable, List, Set, TypeVar, Union, final
 
 import qtawesome as qta
 from PySide6.QtGui import QIcon
 from PySide6.QtWidgets import QWidget
 
 from edobot.core.config import Config
+from edobot.core.storage import Storage
 from edobot.model import EventType, User, UserType
 from edobot.obs import OBSInterface
 from edobot.services.twitch import Chat  # TODO: Replace with ChatWrapper
@@ -13,6 +17,8 @@ from edobot.services.twitch import Service as TwitchService
 
 __all__ = ["Component"]
 
+T = TypeVar("T")
+
 
 class Component(ABC):
     class Metadata:
@@ -24,14 +30,34 @@ class Component(ABC):
 
     def __init__(self) -> None:
         super().__init__()
+        self.command_changed: Callable[[], None] | None = None
 
     @final
-    def config_component(self, config: Config, obs: OBSInterface, chat: Chat, twitch: TwitchService) -> None:
+    def config_component(
+        self, config: Config, obs: OBSInterface, chat: Chat, twitch: TwitchService, storage: Storage
+    ) -> None:
         self.config = config
+        self.storage = storage
         self.obs = obs
         self.chat = chat
         self.twitch = twitch
 
+    @final
+    def notify_command_changed(self) -> None:
+        """Must be called when the value returned by get_command changes after the component started"""
+        if self.command_changed is not None:
+            self.command_changed()
+
+    @final
+    def is_async(self) -> bool:
+        """True if process_message or process_event are coroutines"""
+        return inspect.iscoroutinefunction(self.process_message) or inspect.iscoroutinefunction(self.process_event)
+
+    @final
+    async def run_blocking(self, function: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+        """Awaits a blocking call (e.g. a Twitch API request) without blocking the event loop"""
+        return await asyncio.get_running_loop().run_in_executor(None, partial(function, *args, **kwargs))
+
     @staticmethod
     @abstractmethod
     def get_id() -> str:
@@ -0,0 +1,237 @@
+import asyncio
+import concurrent.futures
+import inspect
+import logging
+import threading
+import time
+from collections import deque
+from enum import Enum
+from typing import Any, Callable, Deque, Hashable, Iterable, MutableMapping, Optional, Tuple, Union
+
+__all__ = ["AsyncComponentWorker", "ComponentWorker", "OverflowPolicy", "stop_workers"]
+
+gLogger = logging.getLogger(f"edobot.{__name__}")
+
+DRAIN_TIMEOUT_SECONDS = 5
+
+
+class OverflowPolicy(Enum):
+    BLOCK = "block"  # The producer waits until the worker frees a slot
+    DROP_OLDEST = "drop_oldest"  # The oldest queued task is discarded to make room
+    COALESCE = "coalesce"  # Tasks with an already queued key are discarded, otherwise behaves as DROP_OLDEST
+
+
+class ComponentWorker(threading.Thread):
+    Task = Callable[[], Any]
+
+    def __init__(self, name: str, max_size: int = 256, overflow_policy: OverflowPolicy = OverflowPolicy.DROP_OLDEST):
+        super().__init__(name=f"{name}WorkerThread", daemon=True)
+        self.max_size = max(1, max_size)
+        self.overflow_policy = overflow_policy
+        self.running = True
+        self.dropped = 0
+        self.__queue: Deque[Tuple[Optional[Hashable], ComponentWorker.Task]] = deque()
+        self.__queued_keys: MutableMapping[Hashable, int] = {}
+        self.__condition = threading.Condition()
+
+    def depth(self) -> int:
+        return len(self.__queue)
+
+    def submit(self, task: Task, coalesce_key: Optional[Hashable] = None) -> bool:
+        with self.__condition:
+            if not self.running:
+                return False
+            if self.overflow_policy == OverflowPolicy.COALESCE and coalesce_key in self.__queued_keys:
+                self.dropped += 1
+                return False
+            if self.overflow_policy == OverflowPolicy.BLOCK:
+                while self.running and len(self.__queue) >= self.max_size:
+                    self.__condition.wait()
+                if not self.running:
+                    return False
+            elif len(self.__queue) >= self.max_size:
+                self.__pop_task()
+                self.dropped += 1
+                gLogger.debug(f"{self.name} queue full, dropping the oldest task")
+            self.__queue.append((coalesce_key, task))
+            if coalesce_key is not None:
+                self.__queued_keys[coalesce_key] = self.__queued_keys.get(coalesce_key, 0) + 1
+            self.__condition.notify_all()
+            return True
+
+    def request_stop(self) -> None:
+        """Stops accepting tasks, the already queued ones keep running"""
+        with self.__condition:
+            self.running = False
+            self.__condition.notify_all()
+
+    def stop(self, timeout: float = DRAIN_TIMEOUT_SECONDS) -> None:
+        """Stops accepting tasks and waits up to timeout seconds for the already queued ones to run"""
+        self.request_stop()
+        if threading.current_thread() is self:
+            return  # The loop exits once the queue is drained
+        if self.is_alive():
+            self.join(timeout)
+        with self.__condition:
+            if self.__queue:
+                gLogger.warning(f"{self.name} stopped with {len(self.__queue)} pending tasks")
+                self.dropped += len(self.__queue)
+                self.__queue.clear()
+                self.__queued_keys.clear()
+
+    def run(self) -> None:
+        while True:
+            with self.__condition:
+                while self.running and not self.__queue:
+                    self.__condition.wait()
+                if not self.__queue:
+                    return
+                task = self.__pop_task()
+                self.__condition.notify_all()
+            task()
+
+    def __pop_task(self) -> Task:
+        coalesce_key, task = self.__queue.popleft()
+        if coalesce_key is not None:
+            count = self.__queued_keys[coalesce_key] - 1
+            if count > 0:
+                self.__queued_keys[coalesce_key] = count
+            else:
+                del self.__queued_keys[coalesce_key]
+        return task
+
+
+class AsyncComponentWorker:
+    """ComponentWorker counterpart for components with coroutine handlers.
+
+    The queue is consumed by a task in the given event loop instead of a dedicated thread. Producers can't
+    be blocked, since they usually run in that same loop, so the BLOCK policy behaves as DROP_OLDEST.
+    """
+
+    Task = Callable[[], Any]
+
+    def __init__(
+        self,
+        name: str,
+        loop: asyncio.AbstractEventLoop,
+        max_size: int = 256,
+        overflow_policy: OverflowPolicy = OverflowPolicy.DROP_OLDEST,
+    ):
+        self.name = f"{name}AsyncWorker"
+        self.loop = loop
+        self.max_size = max(1, max_size)
+        self.overflow_policy = overflow_policy
+        self.running = True
+        self.dropped = 0
+        self.__queue: Deque[Tuple[Optional[Hashable], AsyncComponentWorker.Task]] = deque()
+        self.__queued_keys: MutableMapping[Hashable, int] = {}
+        self.__lock = threading.Lock()
+        self.__wakeup: Optional[asyncio.Event] = None
+        self.__future: Optional[Any] = None
+
+    def depth(self) -> int:
+        return len(self.__queue)
+
+    def start(self) -> None:
+        self.__future = asyncio.run_coroutine_threadsafe(self.__run(), self.loop)
+
+    def is_alive(self) -> bool:
+        return self.__future is not None and not self.__future.done()
+
+    def submit(self, task: Task, coalesce_key: Optional[Hashable] = None) -> bool:
+        with self.__lock:
+            if not self.running:
+                return False
+            if self.overflow_policy == OverflowPolicy.COALESCE and coalesce_key in self.__queued_keys:
+                self.dropped += 1
+                return False
+            if len(self.__queue) >= self.max_size:
+                self.__pop_task()
+                self.dropped += 1
+                gLogger.debug(f"{self.name} queue full, dropping the oldest task")
+            self.__queue.append((coalesce_key, task))
+            if coalesce_key is not None:
+                self.__queued_keys[coalesce_key] = self.__queued_keys.get(coalesce_key, 0) + 1
+        self.loop.call_soon_threadsafe(self.__wake)
+        return True
+
+    def request_stop(self) -> None:
+        """Stops accepting tasks, the already queued ones keep running"""
+        with self.__lock:
+            self.running = False
+        if not self.loop.is_closed():
+            self.loop.call_soon_threadsafe(self.__wake)
+
+    def stop(self, timeout: float = DRAIN_TIMEOUT_SECONDS) -> None:
+        """Stops accepting tasks and waits up to timeout seconds for the already queued ones to run"""
+        self.request_stop()
+        if self.loop.is_closed():
+            self.__discard_pending()
+            return
+        future = self.__future
+        if future is None:
+            self.__discard_pending()
+        elif not self.__in_loop():
+            try:
+                future.result(timeout)
+            except concurrent.futures.TimeoutError:
+                future.cancel()
+            except Exception as e:
+                gLogger.error(f"{self.name} stopped with an error: {e}")
+            self.__discard_pending()
+
+    def __discard_pending(self) -> None:
+        with self.__lock:
+            if self.__queue:
+                gLogger.warning(f"{self.name} stopped with {len(self.__queue)} pending tasks")
+                self.dropped += len(self.__queue)
+                self.__queue.clear()
+                self.__queued_keys.clear()
+
+    def __in_loop(self) -> bool:
+        try:
+            return asyncio.get_running_loop() is self.loop
+        except RuntimeError:
+            return False
+
+    def __wake(self) -> None:
+        if self.__wakeup is not None:
+            self.__wakeup.set()
+
+    async def __run(self) -> None:
+        self.__wakeup = asyncio.Event()
+        while True:
+            with self.__lock:
+                task = self.__pop_task() if self.__queue else None
+                if task is None:
+                    if not self.running:
+                        return
+                    self.__wakeup.clear()
+            if task is None:
+                await self.__wakeup.wait()
+                continue
+            result = task()
+            if inspect.isawaitable(result):
+                await result
+
+    def __pop_task(self) -> Task:
+        coalesce_key, task = self.__queue.popleft()
+        if coalesce_key is not None:
+            count = self.__queued_keys[coalesce_key] - 1
+            if count > 0:
+                self.__queued_keys[coalesce_key] = count
+            else:
+                del self.__queued_keys[coalesce_key]
+        return task
+
+
+def stop_workers(
+    workers: Iterable[Union[ComponentWorker, AsyncComponentWorker]], timeout: float = DRAIN_TIMEOUT_SECONDS
+) -> None:
+    """Stops the workers together, they drain their queues in parallel for up to timeout seconds in total"""
+    workers = list(workers)
+    for worker in workers:
+        worker.request_stop()
+    deadline = time.monotonic() + timeout
+    for worker in workers:
+        worker.stop(max(0.0, deadline - time.monotonic()))
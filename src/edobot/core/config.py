@@ -1,9 +1,16 @@
+import atexit
+import copy
 import json
 import logging
 import os
 import os.path
+import threading
+import time
 import traceback
-from typing import Any, List, MutableMapping, Union
+from contextlib import contextmanager
+from typing import Any, Iterator, List, MutableMapping, Optional, Tuple, Union
+
+from edobot.network import Backoff, Reactor
 
 Path = List[Union[str, int]]
 ConfigType = Union[MutableMapping[Union[str, int], Any], List[Any]]
@@ -13,7 +20,131 @@ __all__ = ["Config"]
 gLogger = logging.getLogger(f"edobot.{__name__}")
 
 
-class Config:
+class ConfigDocument:
+    """Parsed contents of a config file shared by all the Config views of that file.
+
+    The file is only parsed again when its modification time or size change, e.g. edited by hand.
+    Changes are written behind: bursts of writes are coalesced into a single write done by a reactor
+    worker, replacing the file atomically so a crash can't leave it half written.
+    """
+
+    # Time without changes to wait before writing, and maximum time a change can wait
+    WRITE_DELAY_SECONDS = 0.5
+    MAX_WRITE_DELAY_SECONDS = 2.0
+    # Backoff between the attempts to write a file that keeps failing
+    MAX_RETRY_DELAY_SECONDS = 60.0
+
+    def __init__(self, file: str) -> None:
+        self.file = file
+        self.lock = threading.RLock()
+        self.batch_depth = 0
+        self.__tree: ConfigType = {}
+        self.__signature: Optional[Tuple[int, int]] = None  # (mtime_ns, size) of the parsed file
+        self.__dirty_since: Optional[float] = None
+        self.__flush_timer: Optional[Reactor.Timer] = None
+        self.__write_lock = threading.Lock()
+        self.__retry_backoff = Backoff(1, ConfigDocument.MAX_RETRY_DELAY_SECONDS)
+        self.__retry_time: Optional[float] = None  # No write is attempted before it after a failure
+
+    def tree(self) -> ConfigType:
+        """Returns the up to date tree, must be called with the lock held"""
+        if self.__dirty_since is not None:
+            return self.__tree  # The pending changes are newer than the file
+        try:
+            stat: Optional[os.stat_result] = os.stat(self.file)
+        except FileNotFoundError:
+            stat = None
+        if stat is None or stat.st_size == 0:
+            ConfigDocument.__create_if_not_exist(self.file)
+            stat = os.stat(self.file)
+        signature = (stat.st_mtime_ns, stat.st_size)
+        if signature != self.__signature:
+            with open(self.file, "r", encoding="utf-8") as f:
+                self.__tree = json.load(f)
+            self.__signature = signature
+        return self.__tree
+
+    def mark_dirty(self) -> None:
+        """Schedules the write of the tree, must be called with the lock held"""
+        if self.__dirty_since is None:
+            self.__dirty_since = time.monotonic()
+        if self.batch_depth == 0:  # Otherwise it's written when the batch ends
+            self.__schedule_flush()
+
+    def begin_batch(self) -> None:
+        with self.lock:
+            self.batch_depth += 1
+
+    def end_batch(self) -> None:
+        with self.lock:
+            self.batch_depth -= 1
+            if self.batch_depth == 0 and self.__dirty_since is not None:
+                self.__schedule_flush()
+
+    def __schedule_flush(self) -> None:
+        now = time.monotonic()
+        if self.__flush_timer is not None:
+            self.__flush_timer.cancel()
+        dirty_since = self.__dirty_since if self.__dirty_since is not None else now
+        delay = min(ConfigDocument.WRITE_DELAY_SECONDS, dirty_since + ConfigDocument.MAX_WRITE_DELAY_SECONDS - now)
+        if self.__retry_time is not None:
+            delay = max(delay, self.__retry_time - now)
+        reactor = Reactor.shared()
+        self.__flush_timer = reactor.call_later(max(0.0, delay), lambda: reactor.run_in_executor(self.flush))
+
+    def flush(self) -> bool:
+        """Writes the pending changes, if any"""
+        with self.__write_lock:
+            with self.lock:
+                if self.__dirty_since is None:
+                    return True
+                if self.__flush_timer is not None:
+                    self.__flush_timer.cancel()
+                    self.__flush_timer = None
+                contents = json.dumps(self.__tree, indent=4)
+                self.__dirty_since = None
+            try:
+                signature = ConfigDocument.__write_atomically(self.file, contents)
+            except Exception as e:
+                with self.lock:
+                    first_failure = self.__retry_time is None
+                    delay = self.__retry_backoff.next_delay()
+                    self.__retry_time = time.monotonic() + delay
+                    self.mark_dirty()  # Try again later with whatever the tree has then
+                if first_failure:
+                    traceback_str = "".join(traceback.format_tb(e.__traceback__))
+                    gLogger.critical(f"Critical error writing '{self.file}': {e}\n{traceback_str}")
+                else:
+                    gLogger.warning(f"Error writing '{self.file}', retrying in {delay:.0f}s: {e}")
+                return False
+            with self.lock:
+                self.__retry_time = None
+                self.__retry_backoff.reset()
+                if self.__dirty_since is None:
+                    self.__signature = signature
+            return True
+
+    @staticmethod
+    def __write_atomically(file: str, contents: str) -> Tuple[int, int]:
+        temp_file = f"{file}.tmp"
+        with open(temp_file, "w", encoding="utf-8") as f:
+            f.write(contents)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_file, file)
+        stat = os.stat(file)
+        return (stat.st_mtime_ns, stat.st_size)
+
+    @staticmethod
+    def get(file: str) -> "ConfigDocument":
+        file = os.path.abspath(file)
+        with gDocumentsLock:
+            document = gDocuments.get(file)
+            if document is None:
+                document = ConfigDocument(file)
+                gDocuments[file] = document
+            return document
+
     @staticmethod
     def __create_if_not_exist(file_path: str) -> None:
         if not os.path.exists(file_path):
@@ -26,52 +157,62 @@ class Config:
             with open(file_path, "w", encoding="utf-8") as f:
                 f.write("{}")
 
+
+gDocuments: MutableMapping[str, ConfigDocument] = {}
+gDocumentsLock = threading.Lock()
+
+
+def _flush_all_documents() -> None:
+    with gDocumentsLock:
+        documents = list(gDocuments.values())
+    for document in documents:
+        document.flush()
+
+
+atexit.register(_flush_all_documents)
+
+
+class Config:
     @staticmethod
     def __write_config(file: str, path: Path, data: Any) -> bool:
-        Config.__create_if_not_exist(file)
-        with open(file, "r", encoding="utf-8") as f:
-            initial_file_contents = f.read()
-        config: ConfigType = json.loads(initial_file_contents)
-        config_root = config
-        for key in path[:-1]:
+        document = ConfigDocument.get(file)
+        with document.lock:
+            config = document.tree()
+            for key in path[:-1]:
+                if isinstance(config, dict):
+                    if key not in config:
+                        config[key] = {}
+                    config = config[key]
+                elif isinstance(config, list) and isinstance(key, int) and key < len(config):
+                    config = config[key]
+                else:
+                    return False
+            last_key = path[-1]
+            # The caller keeps its own copy, later changes to it must not reach the shared tree
+            data = copy.deepcopy(data)
             if isinstance(config, dict):
-                if key not in config:
-                    config[key] = {}
-                config = config[key]
-            elif isinstance(config, list) and isinstance(key, int) and key < len(config):
-                config = config[key]
+                config[last_key] = data
+            elif isinstance(config, list) and isinstance(last_key, int) and last_key < len(config):
+                config[last_key] = data
             else:
                 return False
-        last_key = path[-1]
-        if isinstance(config, dict):
-            config[last_key] = data
-        elif isinstance(config, list) and isinstance(last_key, int) and last_key < len(config):
-            config[last_key] = data
-        else:
-            return False
-        try:
-            with open(file, "w", encoding="utf-8") as f:
-                json.dump(config_root, f, indent=4)
-        except Exception as e:
-            traceback_str = "".join(traceback.format_tb(e.__traceback__))
-            gLogger.critical(f"Critical error: {e}\n{traceback_str}")
-            with open(file, "w", encoding="utf-8") as f:
-                f.write(initial_file_contents)
+            document.mark_dirty()
         return True
 
     @staticmethod
     def __read_config(file: str, path: Path) -> Any:
-        Config.__create_if_not_exist(file)
-        with open(file, "r", encoding="utf-8") as f:
-            config: ConfigType = json.load(f)
-        for key in path:
-            if isinstance(config, dict) and key in config:
-                config = config[key]
-            elif isinstance(config, list) and isinstance(key, int) and key < len(config):
-                config = config[key]
-            else:
-                return None
-        return config
+        document = ConfigDocument.get(file)
+        with document.lock:
+            config = document.tree()
+            for key in path:
+                if isinstance(config, dict) and key in config:
+                    config = config[key]
+                elif isinstance(config, list) and isinstance(key, int) and key < len(config):
+                    config = config[key]
+                else:
+                    return None
+            # Callers are used to getting their own objects, as when every read parsed the file
+            return copy.deepcopy(config) if isinstance(config, (dict, list)) else config
 
     def __init__(self, file: str, path: Path = []) -> None:
         self.file: str = file
@@ -80,6 +221,24 @@ class Config:
     def __getitem__(self, key: Union[str, int]) -> "Config":
         return Config(self.file, self.path + [key])
 
+    @contextmanager
+    def batch(self) -> Iterator["Config"]:
+        """Groups all the changes done inside the block in a single write"""
+        document = ConfigDocument.get(self.file)
+        document.begin_batch()
+        try:
+            yield self
+        finally:
+            document.end_batch()
+
+    def flush(self) -> bool:
+        """Writes now the pending changes of the file"""
+        return ConfigDocument.get(self.file).flush()
+
+    @staticmethod
+    def flush_all() -> None:
+        _flush_all_documents()
+
     def get(self, default: Any = None) -> Any:
         if len(self.path) > 0:
             ret = Config.__read_config(self.file, self.path)
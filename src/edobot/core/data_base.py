@@ -1,40 +1,158 @@
+import json
+import logging
+import os
 import os.path
-from typing import Optional
-
-from tinydb import TinyDB, where
+import sqlite3
+import threading
+import weakref
+from contextlib import contextmanager
+from typing import Any, Iterable, Iterator, MutableMapping, Optional, Sequence, Set
 
 from edobot.model import AccessToken
 
-__all__ = ["DataBase"]
+__all__ = ["DataBase", "SQLiteDatabase"]
+
+gLogger = logging.getLogger(f"edobot.{__name__}")
+
+
+class _ConnectionHolder:
+    """Thread local reference to a connection, the connection is closed when the holder is released"""
+
+    def __init__(self, connection: sqlite3.Connection) -> None:
+        self.connection = connection
+
+
+class SQLiteDatabase:
+    """SQLite file in WAL mode with a long lived connection per thread.
+
+    WAL lets the readers go on while another thread writes, and keeping the connections open avoids
+    paying the open and schema checks on every query. A connection is closed when its thread ends.
+    There is a single instance per file.
+    """
+
+    instances: MutableMapping[str, "SQLiteDatabase"] = {}
+    instances_lock = threading.Lock()
 
+    def __init__(self, file: str) -> None:
+        self.file = file
+        self.__local = threading.local()
+        self.__connections: Set[sqlite3.Connection] = set()
+        self.__connections_lock = threading.Lock()
 
-class DataBasePrivate:
-    def __init__(self, store_dir):
-        self.db = TinyDB(os.path.join(store_dir, "db.json"), indent=4)
+    @staticmethod
+    def open(file: str) -> "SQLiteDatabase":
+        file = os.path.abspath(file)
+        with SQLiteDatabase.instances_lock:
+            database = SQLiteDatabase.instances.get(file)
+            if database is None:
+                os.makedirs(os.path.dirname(file), exist_ok=True)
+                database = SQLiteDatabase(file)
+                SQLiteDatabase.instances[file] = database
+            return database
+
+    def connection(self) -> sqlite3.Connection:
+        holder: Optional[_ConnectionHolder] = getattr(self.__local, "holder", None)
+        if holder is None:
+            # Only its thread uses it, but it may be closed from another one when the thread ends or on close()
+            connection = sqlite3.connect(self.file, timeout=10, isolation_level=None, check_same_thread=False)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            holder = _ConnectionHolder(connection)
+            self.__local.holder = holder
+            with self.__connections_lock:
+                self.__connections.add(connection)
+            weakref.finalize(holder, self.__release, connection)  # The thread local is cleared when the thread ends
+        return holder.connection
+
+    def execute(self, sql: str, parameters: Sequence[Any] = ()) -> sqlite3.Cursor:
+        return self.connection().execute(sql, parameters)
+
+    def executemany(self, sql: str, parameters: Iterable[Sequence[Any]]) -> sqlite3.Cursor:
+        with self.transaction() as connection:
+            return connection.executemany(sql, parameters)
+
+    @contextmanager
+    def transaction(self) -> Iterator[sqlite3.Connection]:
+        """Runs the statements inside the block in a single transaction, nested blocks join the outer one"""
+        connection = self.connection()
+        if connection.in_transaction:
+            yield connection
+            return
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            yield connection
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+        connection.execute("COMMIT")
+
+    def close(self) -> None:
+        """Closes every open connection, the threads that use the database again get a new one"""
+        self.__local = threading.local()
+        with self.__connections_lock:
+            connections = list(self.__connections)
+            self.__connections.clear()
+        for connection in connections:
+            connection.close()
+
+    def open_connections(self) -> int:
+        with self.__connections_lock:
+            return len(self.__connections)
+
+    def __release(self, connection: sqlite3.Connection) -> None:
+        with self.__connections_lock:
+            self.__connections.discard(connection)
+        connection.close()
 
 
 class DataBase:
-    instance: Optional[DataBasePrivate] = None
+    def __init__(self, store_dir: str):
+        self.__db = SQLiteDatabase.open(os.path.join(store_dir, "db.sqlite3"))
+        with self.__db.transaction() as connection:
+            connection.execute("CREATE TABLE IF NOT EXISTS tokens (user TEXT PRIMARY KEY, token TEXT NOT NULL)")
+            connection.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+        self.__migrate_json(os.path.join(store_dir, "db.json"))
 
-    def __init__(self, store_dir):
-        if not DataBase.instance:
-            DataBase.instance = DataBasePrivate(store_dir)
-        self.__db = DataBase.instance.db
+    @property
+    def database(self) -> SQLiteDatabase:
+        return self.__db
 
     def set_user_token(self, user: str, token: AccessToken) -> None:
-        tokens_table = self.__db.table("tokens")
-        findings = tokens_table.search(where("user") == user)
-        if len(findings) == 0:
-            tokens_table.insert({"user": user, "token": token.__dict__})
-        else:
-            tokens_table.update({"user": user, "token": token.__dict__}, where("user") == user)
+        self.__db.execute(
+            "INSERT INTO tokens (user, token) VALUES (?, ?) ON CONFLICT(user) DO UPDATE SET token = excluded.token",
+            (user, json.dumps(token.__dict__)),
+        )
 
     def get_token_for_user(self, user: str) -> Optional[AccessToken]:
-        tokens_table = self.__db.table("tokens")
-        findings = tokens_table.search(where("user") == user)
-        if len(findings) > 0:
-            return AccessToken(**findings[0]["token"])
+        row = self.__db.execute("SELECT token FROM tokens WHERE user = ?", (user,)).fetchone()
+        if row is not None:
+            return AccessToken(**json.loads(row[0]))
 
     def remove_user(self, user: str) -> Optional[AccessToken]:
-        tokens_table = self.__db.table("tokens")
-        tokens_table.remove(where("user") == user)
+        self.__db.execute("DELETE FROM tokens WHERE user = ?", (user,))
+
+    def __migrate_json(self, json_file: str) -> None:
+        """Imports the tokens of the previous TinyDB store once"""
+        if not os.path.isfile(json_file):
+            return
+        if self.__db.execute("SELECT 1 FROM meta WHERE key = 'tinydb_migrated'").fetchone() is not None:
+            return
+        try:
+            with open(json_file, "r", encoding="utf-8") as f:
+                documents = json.load(f).get("tokens", {})
+        except (OSError, ValueError) as e:
+            gLogger.error(f"Error reading '{json_file}', the tokens won't be migrated: {e}")
+            return
+        with self.__db.transaction() as connection:
+            for document in documents.values():
+                if "user" in document and "token" in document:
+                    connection.execute(
+                        "INSERT OR IGNORE INTO tokens (user, token) VALUES (?, ?)",
+                        (document["user"], json.dumps(document["token"])),
+                    )
+            connection.execute("INSERT INTO meta (key, value) VALUES ('tinydb_migrated', '1')")
+        try:
+            os.replace(json_file, f"{json_file}.migrated")
+        except OSError:
+            pass
+        gLogger.info(f"Migrated {len(documents)} tokens from '{json_file}'")
@@ -0,0 +1,122 @@
+import logging
+import threading
+import time
+from enum import Enum
+from typing import Any, Callable, Hashable, List, Mapping, Optional, Tuple
+
+from edobot.model import EventType
+from edobot.network.ttl_cache import TTLCache
+
+__all__ = ["BusEvent", "EventBus", "EventSource"]
+
+gLogger = logging.getLogger(f"edobot.{__name__}")
+
+
+class EventSource(Enum):
+    IRC = "irc"
+    PUBSUB = "pubsub"
+    EVENTSUB = "eventsub"
+
+
+class BusEvent:
+    __slots__ = ("type", "source", "metadata", "key", "received_time")
+
+    def __init__(self, type: EventType, source: EventSource, metadata: Any, key: Optional[Hashable]) -> None:
+        self.type = type
+        self.source = source
+        self.metadata = metadata
+        self.key = key
+        self.received_time = time.time()
+
+
+def _first_attr(metadata: Any, *names: str) -> Any:
+    for name in names:
+        value = getattr(metadata, name, None)
+        if value is not None:
+            return value
+    return None
+
+
+def get_event_key(event_type: EventType, metadata: Any) -> Tuple[Optional[Hashable], bool]:
+    """Key identifying the event whatever its source, and whether it's a unique id or only a fingerprint.
+
+    Channel point redemptions share their id between PubSub and EventSub, the other events don't carry a
+    common id so they are identified by who did what.
+    """
+    if event_type == EventType.REWARD_REDEEMED:
+        redemption = getattr(metadata, "redemption", metadata)  # PubSub nests the redemption
+        redemption_id = getattr(redemption, "id", None)
+        return (("reward", redemption_id), True) if redemption_id else (None, False)
+    if event_type == EventType.RAID:
+        login = _first_attr(metadata, "login", "from_broadcaster_user_login")
+        return (("raid", login.lower()), False) if login else (None, False)
+    if event_type == EventType.BITS:
+        user = _first_attr(metadata, "user_id", "user_name")
+        bits = _first_attr(metadata, "bits_used", "bits")
+        return ("bits", user, bits), False
+    if event_type == EventType.SUBSCRIPTION:
+        user = _first_attr(metadata, "recipient_id", "user_id", "user_name")
+        return (("subscription", user), False) if user else (None, False)
+    return None, False
+
+
+class EventBus:
+    """Single stream for the events received from chat, PubSub and EventSub.
+
+    The same event usually arrives from more than one source, only the first copy seen inside the
+    deduplication window is delivered. Events identified by an id are delivered once, events identified
+    by a fingerprint pair each copy with one from another source, so repeated events from the same
+    source (e.g. two cheers of the same amount) are all delivered.
+    """
+
+    Subscriber = Callable[[BusEvent], None]
+
+    def __init__(self, dedup_window_seconds: float = 120, max_tracked_events: int = 4096) -> None:
+        self.subscribers: List[EventBus.Subscriber] = []
+        self.delivered = 0
+        self.duplicates = 0
+        # key -> sources of the delivered copies still waiting for their duplicate
+        self.__seen: TTLCache[Hashable, List[EventSource]] = TTLCache(dedup_window_seconds, max_tracked_events)
+        self.__lock = threading.Lock()
+
+    def subscribe(self, subscriber: Subscriber) -> None:
+        self.subscribers.append(subscriber)
+
+    def publisher(self, source: EventSource) -> Callable[[EventType, Any], None]:
+        """Callback to subscribe to a service so its events are published from the given source"""
+        return lambda event_type, metadata: self.publish(source, event_type, metadata)
+
+    def publish(self, source: EventSource, event_type: EventType, metadata: Any) -> bool:
+        key, unique = get_event_key(event_type, metadata)
+        if key is not None and self.__is_duplicate(key, unique, source):
+            self.duplicates += 1
+            gLogger.debug(f"Dropping duplicated {event_type.name} event from {source.value}: {key}")
+            return False
+        self.delivered += 1
+        event = BusEvent(event_type, source, metadata, key)
+        for subscriber in self.subscribers:
+            try:
+                subscriber(event)
+            except Exception as e:
+                gLogger.error(f"Error delivering {event_type.name} event: {e}")
+        return True
+
+    def stats(self) -> Mapping[str, int]:
+        return {"delivered": self.delivered, "duplicates": self.duplicates, "tracked": len(self.__seen)}
+
+    def __is_duplicate(self, key: Hashable, unique: bool, source: EventSource) -> bool:
+        with self.__lock:
+            sources = self.__seen.get(key)
+            if sources is None:
+                self.__seen.set(key, [source])
+                return False
+            if unique:
+                return True
+            for i, seen_source in enumerate(sources):
+                if seen_source != source:
+                    del sources[i]
+                    if not sources:
+                        self.__seen.pop(key)
+                    return True
+            sources.append(source)
+            return False
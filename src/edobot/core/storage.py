@@ -0,0 +1,85 @@
+import json
+import time
+from contextlib import contextmanager
+from typing import Any, Iterator, List, Mapping, Optional, Tuple
+
+from .data_base import SQLiteDatabase
+
+__all__ = ["Storage"]
+
+
+class Storage:
+    """Key-value store of a component, namespaced inside a shared SQLite file.
+
+    Values are stored as JSON and keys may expire after a TTL. The statements are constant and parametrized,
+    so sqlite keeps them prepared in the statement cache of each pooled connection.
+    """
+
+    SELECT = "SELECT value FROM storage WHERE namespace = ? AND key = ? AND (expires_at IS NULL OR expires_at > ?)"
+    SELECT_ALL = "SELECT key, value FROM storage WHERE namespace = ? AND (expires_at IS NULL OR expires_at > ?)"
+    UPSERT = (
+        "INSERT INTO storage (namespace, key, value, expires_at) VALUES (?, ?, ?, ?) "
+        "ON CONFLICT(namespace, key) DO UPDATE SET value = excluded.value, expires_at = excluded.expires_at"
+    )
+    DELETE = "DELETE FROM storage WHERE namespace = ? AND key = ?"
+    CLEAR = "DELETE FROM storage WHERE namespace = ?"
+    PURGE = "DELETE FROM storage WHERE namespace = ? AND expires_at IS NOT NULL AND expires_at <= ?"
+
+    def __init__(self, database: SQLiteDatabase, namespace: str) -> None:
+        self.database = database
+        self.namespace = namespace
+        with database.transaction() as connection:
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS storage ("
+                "namespace TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL, expires_at REAL, "
+                "PRIMARY KEY (namespace, key)) WITHOUT ROWID"
+            )
+            connection.execute(
+                "CREATE INDEX IF NOT EXISTS storage_expires_at ON storage (expires_at) WHERE expires_at IS NOT NULL"
+            )
+        self.purge_expired()
+
+    def table(self, name: str) -> "Storage":
+        """Separate store inside this namespace, e.g. one row per user"""
+        return Storage(self.database, f"{self.namespace}.{name}")
+
+    def get(self, key: str, default: Any = None) -> Any:
+        row = self.database.execute(self.SELECT, (self.namespace, key, time.time())).fetchone()
+        return json.loads(row[0]) if row is not None else default
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        """Stores the value, which expires after ttl seconds if given"""
+        self.database.execute(self.UPSERT, (self.namespace, key, json.dumps(value), self.__expires_at(ttl)))
+
+    def set_many(self, items: Mapping[str, Any], ttl: Optional[float] = None) -> None:
+        """Stores all the values in a single transaction"""
+        expires_at = self.__expires_at(ttl)
+        self.database.executemany(
+            self.UPSERT, [(self.namespace, key, json.dumps(value), expires_at) for key, value in items.items()]
+        )
+
+    def delete(self, key: str) -> None:
+        self.database.execute(self.DELETE, (self.namespace, key))
+
+    def clear(self) -> None:
+        self.database.execute(self.CLEAR, (self.namespace,))
+
+    def items(self) -> List[Tuple[str, Any]]:
+        rows = self.database.execute(self.SELECT_ALL, (self.namespace, time.time())).fetchall()
+        return [(key, json.loads(value)) for key, value in rows]
+
+    def purge_expired(self) -> None:
+        self.database.execute(self.PURGE, (self.namespace, time.time()))
+
+    @contextmanager
+    def batch(self) -> Iterator["Storage"]:
+        """Groups the writes inside the block in a single transaction"""
+        with self.database.transaction():
+            yield self
+
+    def __contains__(self, key: str) -> bool:
+        return self.database.execute(self.SELECT, (self.namespace, key, time.time())).fetchone() is not None
+
+    @staticmethod
+    def __expires_at(ttl: Optional[float]) -> Optional[float]:
+        return time.time() + ttl if ttl is not None else None
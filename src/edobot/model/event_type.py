@@ -8,3 +8,4 @@ class EventType(IntEnum):
     BITS = 2
     RAID = 3
     SUBSCRIPTION = 4
+    SUBSCRIPTION_GIFT = 5  # Summary of a batch of gifted subs, each gifted sub is also a SUBSCRIPTION
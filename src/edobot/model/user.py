@@ -1,6 +1,7 @@
-__all__ = ["User"]
+__all__ = ["User", "LazyUser"]
 
-from typing import Any, Optional
+import threading
+from typing import Any, Callable, Optional
 
 
 class User:
@@ -16,3 +17,45 @@ class User:
         self.view_count: int = kwargs["view_count"]
         self.created_at: str = kwargs["created_at"]
         self.email: Optional[str] = kwargs.get("email", None)
+
+
+class LazyUser(User):
+    """User built from the data already available (e.g. chat tags), the fields only provided by the
+    Helix API are requested with the loader the first time any of them is accessed."""
+
+    LAZY_FIELDS = {
+        "broadcaster_type": "",
+        "description": "",
+        "offline_image_url": "",
+        "profile_image_url": "",
+        "type": "",
+        "view_count": 0,
+        "created_at": "",
+        "email": None,
+    }
+
+    def __init__(self, id: str, login: str, display_name: str, loader: Callable[[], Optional[User]]) -> None:
+        self.id = id
+        self.login = login
+        self.display_name = display_name or login
+        self.__loader: Optional[Callable[[], Optional[User]]] = loader
+        self.__load_lock = threading.Lock()
+
+    def __getattr__(self, name: str) -> Any:
+        # Only called when the attribute is not set yet
+        if name not in LazyUser.LAZY_FIELDS:
+            raise AttributeError(f"'{self.__class__.__name__}' object has no attribute '{name}'")
+        self.load()
+        return self.__dict__[name]
+
+    def is_loaded(self) -> bool:
+        return self.__loader is None
+
+    def load(self) -> None:
+        with self.__load_lock:
+            if self.__loader is None:
+                return
+            user = self.__loader()
+            for field, default in LazyUser.LAZY_FIELDS.items():
+                self.__dict__[field] = getattr(user, field, default) if user is not None else default
+            self.__loader = None
@@ -1,2 +1,5 @@
+from .reactor import *
+from .asyncio_reactor import *
+from .reconnect import *
 from .socket_connector import *
 from .websocket import *
@@ -0,0 +1,120 @@
+import asyncio
+import logging
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Awaitable, Callable, MutableMapping, TypeVar
+
+from .reactor import Reactor, ReactorConnection
+
+__all__ = ["AsyncioReactor"]
+
+T = TypeVar("T")
+
+gLogger = logging.getLogger(f"edobot.{__name__}")
+
+
+class AsyncioReactor(Reactor):
+    """Reactor implemented on top of an asyncio event loop.
+
+    The connections, timers and the coroutines of the async components share the same loop, so a single
+    thread serves every channel. Blocking calls (e.g. Helix requests) must be sent to the executor with
+    run_blocking instead of being called from a coroutine.
+    """
+
+    def __init__(self, executor_workers: int = 4) -> None:
+        super().__init__(name="AsyncioReactorThread", daemon=True)
+        # The readiness callbacks need a selector loop, new_event_loop() returns a proactor one on Windows
+        self.loop = asyncio.SelectorEventLoop()
+        self.__executor = ThreadPoolExecutor(max_workers=executor_workers, thread_name_prefix="ReactorWorker")
+        self.loop.set_default_executor(self.__executor)
+        self.__connections: MutableMapping[int, ReactorConnection] = {}
+        self.__ready = threading.Event()
+
+    def run(self) -> None:
+        asyncio.set_event_loop(self.loop)
+        self.loop.call_soon(self.__ready.set)
+        self.loop.run_forever()
+
+    def call_soon(self, callback: Callable[[], None]) -> None:
+        if self.in_reactor_thread():
+            self.loop.call_soon(self.__safe_call, callback)
+        else:
+            self.loop.call_soon_threadsafe(self.__safe_call, callback)
+
+    def call_later(self, delay: float, callback: Callable[[], None]) -> "Reactor.Timer":
+        timer = Reactor.Timer(callback)
+
+        def schedule():
+            if not timer.cancelled:
+                timer.handle = self.loop.call_later(delay, self.__safe_call, callback)
+
+        if self.in_reactor_thread():
+            schedule()
+        else:
+            self.loop.call_soon_threadsafe(schedule)
+        return timer
+
+    def run_in_executor(self, task: Callable[..., Any], *args: Any) -> None:
+        self.__executor.submit(task, *args)
+
+    async def run_blocking(self, task: Callable[..., T], *args: Any) -> T:
+        """Awaits a blocking call done in the executor, to be used from the coroutines running in the loop"""
+        return await self.loop.run_in_executor(self.__executor, task, *args)
+
+    def run_coroutine(self, coroutine: Awaitable[T]) -> "Future[T]":
+        """Schedules a coroutine in the loop from any thread"""
+        self.__ready.wait()
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop)  # type: ignore[arg-type]
+
+    def register(self, connection: ReactorConnection) -> None:
+        self.__run_in_loop(lambda: self.__register(connection))
+
+    def unregister(self, connection: ReactorConnection) -> None:
+        self.__run_in_loop(lambda: self.__unregister(connection))
+
+    def __run_in_loop(self, callback: Callable[[], None]) -> None:
+        if self.in_reactor_thread():
+            callback()
+            return
+        self.__ready.wait()
+        done = threading.Event()
+
+        def wrapper():
+            try:
+                callback()
+            finally:
+                done.set()
+
+        self.loop.call_soon_threadsafe(wrapper)
+        done.wait()
+
+    def __register(self, connection: ReactorConnection) -> None:
+        fileno = connection.fileno()
+        if fileno < 0 or self.__connections.get(fileno) is connection:
+            return
+        self.__unregister(connection)
+        if fileno in self.__connections:  # The descriptor was reused
+            del self.__connections[fileno]
+            self.loop.remove_reader(fileno)
+        self.loop.add_reader(fileno, self.__handle_readable, connection)
+        self.__connections[fileno] = connection
+
+    def __unregister(self, connection: ReactorConnection) -> None:
+        for fileno, registered in list(self.__connections.items()):
+            if registered is connection:
+                del self.__connections[fileno]
+                self.loop.remove_reader(fileno)
+
+    @staticmethod
+    def __handle_readable(connection: ReactorConnection) -> None:
+        try:
+            connection.handle_readable()
+        except Exception as e:
+            gLogger.error(f"Unhandled error in connection {connection}: {e}")
+
+    @staticmethod
+    def __safe_call(callback: Callable[[], None]) -> None:
+        try:
+            callback()
+        except Exception as e:
+            gLogger.error(f"Unhandled error in reactor call: {e}")
@@ -1,29 +1,182 @@
+import logging
+import threading
 import time
-from typing import Any, Optional
+from concurrent.futures import ThreadPoolExecutor
+from enum import IntEnum
+from typing import Any, Callable, Generic, Mapping, Optional, Protocol, TypeVar
 
-import requests
+from .http_session import HTTPSession
+from .reconnect import Backoff
+from .ttl_cache import approximate_size
 
+T = TypeVar("T")
 
-class CacheRequest:
-    def __init__(self, method: str, url: str, timeout_seconds: int = 5 * 60, **kwargs: Any):
+gLogger = logging.getLogger(f"edobot.{__name__}")
+
+gRefreshExecutor: Optional[ThreadPoolExecutor] = None
+gRefreshExecutorLock = threading.Lock()
+
+
+def _get_refresh_executor() -> ThreadPoolExecutor:
+    global gRefreshExecutor
+    with gRefreshExecutorLock:
+        if gRefreshExecutor is None:
+            gRefreshExecutor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="CacheRequestRefresh")
+        return gRefreshExecutor
+
+
+def _value_size(value: Any) -> int:
+    size = approximate_size(value)
+    if isinstance(value, tuple):
+        size += sum(approximate_size(x) for x in value)
+    return size
+
+
+class RequestPriority(IntEnum):
+    INTERACTIVE = 0  # Someone is waiting for the answer, e.g. a chat message
+    BACKGROUND = 1  # Periodic syncs and background refreshes
+
+
+class RequestScheduler(Protocol):
+    def acquire(self, priority: RequestPriority) -> None: ...
+
+    def update(self, status_code: int, headers: Mapping[str, str]) -> None: ...
+
+
+class CacheRequestError(Exception):
+    def __init__(self, status_code: int, url: str, body: Any) -> None:
+        super().__init__(f"Request to '{url}' failed with status {status_code}: {body}")
+        self.status_code = status_code
+        self.url = url
+        self.body = body
+
+
+class CacheRequest(Generic[T]):
+    """Request whose successful response is decoded once and kept until it expires.
+
+    Only the decoded value is stored, the raw response is discarded right after decoding it. Concurrent
+    callers of an expired request share a single refresh, and when stale_seconds is set an expired value
+    is served for that long while it's refreshed in the background. Error responses are kept for a short
+    time too, so a permanent error (e.g. a 403) isn't requested again on every call.
+    """
+
+    # Time to wait before retrying a failed background refresh, doubled on each consecutive failure
+    STALE_RETRY_TIME = 5 * 1000
+    MAX_STALE_RETRY_TIME = 60 * 1000
+    # Time an error response is raised again without repeating the request, rate limits are always retried
+    ERROR_CACHE_TIME = 60 * 1000
+
+    def __init__(
+        self,
+        method: str,
+        url: str,
+        decoder: Callable[[Any], T],
+        timeout_seconds: int = 5 * 60,
+        stale_seconds: int = 0,
+        scheduler: Optional[RequestScheduler] = None,
+        priority: RequestPriority = RequestPriority.INTERACTIVE,
+        **kwargs: Any,
+    ):
         self.method = method
         self.url = url
+        self.decoder = decoder
         self.timeout = timeout_seconds * 1000
+        self.stale_time = stale_seconds * 1000
+        self.scheduler = scheduler
+        self.priority = priority
         self.expire_time: Optional[int] = None
-        self.cached_response: Optional[requests.Response] = None
+        self.cached_value: Optional[T] = None
+        self.cached_size = 0
+        self.cached_error: Optional[CacheRequestError] = None
+        self.error_expire_time = 0
         self.request_kargs = kwargs
         if method == "GET":
             self.request_kargs.setdefault("allow_redirects", True)
         self.request_kargs.setdefault("params", None)
+        self.__refresh_lock = threading.Lock()
+        self.__state_lock = threading.Lock()
+        self.__refreshing_in_background = False
+        self.__next_refresh_time = 0
+        self.__refresh_backoff = Backoff(CacheRequest.STALE_RETRY_TIME, CacheRequest.MAX_STALE_RETRY_TIME)
+        self.__generation = 0
 
     def set_timeout(self, timeout_seconds: int):
         self.timeout = timeout_seconds * 1000
 
-    def call(self, force: bool = False) -> requests.Response:
+    def prime(self, value: T, expire_time: int) -> None:
+        """Sets a value obtained elsewhere (e.g. a snapshot) as if it was received at the given expire time"""
+        with self.__refresh_lock:
+            self.cached_value = value
+            self.cached_size = _value_size(value)
+            self.expire_time = expire_time
+            self.__generation += 1
+
+    def size(self) -> int:
+        return self.cached_size + len(self.url)
+
+    def call(self, force: bool = False) -> T:
         current_time = round(time.time() * 1000)
-        if force or self.expire_time is None or self.cached_response is None or current_time > self.expire_time:
-            self.expire_time = current_time + self.timeout
-            self.cached_response = requests.request(self.method, self.url, **self.request_kargs)
-            return self.cached_response
-        else:
-            return self.cached_response
+        if not force and self.cached_value is not None and self.expire_time is not None:
+            if current_time <= self.expire_time:
+                return self.cached_value
+            if current_time <= self.expire_time + self.stale_time:
+                if current_time >= self.__next_refresh_time:
+                    self.__refresh_in_background()
+                return self.cached_value
+
+        generation = self.__generation
+        with self.__refresh_lock:
+            # Another caller refreshed the value while this one was waiting
+            if generation != self.__generation and self.cached_value is not None:
+                return self.cached_value
+            # Or got an error that is still valid
+            error = self.cached_error
+            if not force and error is not None and round(time.time() * 1000) <= self.error_expire_time:
+                raise error
+            return self.__fetch(self.priority)
+
+    def __fetch(self, priority: RequestPriority) -> T:
+        if self.scheduler is not None:
+            self.scheduler.acquire(priority)
+        response = HTTPSession.shared().request(self.method, self.url, **self.request_kargs)
+        if self.scheduler is not None:
+            self.scheduler.update(response.status_code, response.headers)
+        if response.status_code != 200:
+            try:
+                body = response.json()
+            except ValueError:
+                body = response.text
+            error = CacheRequestError(response.status_code, response.url, body)
+            if response.status_code != 429:
+                self.cached_error = error
+                self.error_expire_time = round(time.time() * 1000) + CacheRequest.ERROR_CACHE_TIME
+            raise error
+        value = self.decoder(response.json())
+        self.cached_error = None
+        self.cached_value = value
+        self.cached_size = _value_size(value)
+        self.expire_time = round(time.time() * 1000) + self.timeout
+        self.__next_refresh_time = 0
+        self.__refresh_backoff.reset()
+        self.__generation += 1
+        return value
+
+    def __refresh_in_background(self) -> None:
+        with self.__state_lock:
+            if self.__refreshing_in_background:
+                return
+            self.__refreshing_in_background = True
+        _get_refresh_executor().submit(self.__background_refresh)
+
+    def __background_refresh(self) -> None:
+        try:
+            with self.__refresh_lock:
+                if self.expire_time is None or round(time.time() * 1000) > self.expire_time:
+                    self.__fetch(RequestPriority.BACKGROUND)
+        except Exception as e:
+            gLogger.warning(f"Error refreshing url '{self.url}', serving the stale value: {e}")
+            # Back off the next refresh, once the stale time is over the callers get the error
+            self.__next_refresh_time = round(time.time() * 1000 + self.__refresh_backoff.next_delay())
+        finally:
+            with self.__state_lock:
+                self.__refreshing_in_background = False
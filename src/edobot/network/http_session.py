@@ -0,0 +1,68 @@
+import threading
+from typing import Any, Mapping, MutableMapping, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+__all__ = ["HTTPSession"]
+
+
+class HTTPSession:
+    """Process wide HTTP session that keeps the connections alive between requests.
+
+    All the requests done through it share the same connection pools (one per host), so only the
+    first request to a host pays the TCP and TLS handshake.
+    """
+
+    instance: Optional["HTTPSession"] = None
+    instance_lock = threading.Lock()
+
+    def __init__(self, pool_connections: int = 4, pool_maxsize: int = 10) -> None:
+        self.__session = requests.Session()
+        self.__lock = threading.Lock()
+        self.configure(pool_connections, pool_maxsize)
+
+    @staticmethod
+    def shared() -> "HTTPSession":
+        with HTTPSession.instance_lock:
+            if HTTPSession.instance is None:
+                HTTPSession.instance = HTTPSession()
+            return HTTPSession.instance
+
+    def configure(self, pool_connections: int, pool_maxsize: int) -> None:
+        """Sets the number of hosts to keep pools for and the number of connections kept alive for each host"""
+        with self.__lock:
+            self.pool_connections = pool_connections
+            self.pool_maxsize = pool_maxsize
+            for prefix in ("https://", "http://"):
+                previous_adapter = self.__session.adapters.get(prefix)
+                self.__session.mount(prefix, HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize))
+                if previous_adapter is not None:
+                    previous_adapter.close()
+
+    def request(self, method: str, url: str, **kwargs: Any) -> requests.Response:
+        return self.__session.request(method, url, **kwargs)
+
+    def stats(self) -> Mapping[str, Mapping[str, int]]:
+        """Number of requests and opened connections for each host with an active pool"""
+        result: MutableMapping[str, MutableMapping[str, int]] = {}
+        with self.__lock:
+            adapters = set(self.__session.adapters.values())
+        for adapter in adapters:
+            if not isinstance(adapter, HTTPAdapter):
+                continue
+            pools = adapter.poolmanager.pools
+            for key in pools.keys():
+                pool = pools.get(key)
+                if pool is None:
+                    continue
+                host = f"{pool.scheme}://{pool.host}:{pool.port}"
+                host_stats = result.setdefault(host, {"requests": 0, "connections": 0})
+                host_stats["requests"] += pool.num_requests
+                host_stats["connections"] += pool.num_connections
+        for host_stats in result.values():
+            host_stats["reused"] = max(0, host_stats["requests"] - host_stats["connections"])
+        return result
+
+    def close(self) -> None:
+        self.__session.close()
@@ -0,0 +1,216 @@
+import abc
+import heapq
+import itertools
+import logging
+import selectors
+import socket
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Deque, List, MutableMapping, Optional, Protocol, Tuple
+
+__all__ = ["Reactor", "SelectorReactor"]
+
+gLogger = logging.getLogger(f"edobot.{__name__}")
+
+
+class ReactorConnection(Protocol):
+    def fileno(self) -> int: ...
+
+    def handle_readable(self) -> None: ...
+
+
+class Reactor(threading.Thread, abc.ABC):
+    """Single I/O loop shared by all the bot connections.
+
+    The connections are registered in the loop and are only woken up when they have data to read or
+    when one of their timers expires, there are no per connection threads nor polling timeouts.
+    Blocking work that must not stall the loop (e.g. handshakes) is sent to a small executor.
+    """
+
+    instance: Optional["Reactor"] = None
+    instance_lock = threading.Lock()
+
+    class Timer:
+        def __init__(self, callback: Callable[[], None]) -> None:
+            self.callback = callback
+            self.cancelled = False
+            self.handle: Optional[Any] = None  # Backend specific handle
+
+        def cancel(self) -> None:
+            self.cancelled = True
+            if self.handle is not None:
+                self.handle.cancel()
+
+    @staticmethod
+    def shared() -> "Reactor":
+        with Reactor.instance_lock:
+            if Reactor.instance is None:
+                Reactor.instance = SelectorReactor()
+                Reactor.instance.start()
+            return Reactor.instance
+
+    @staticmethod
+    def install(reactor: "Reactor") -> bool:
+        """Sets the reactor used by all the connections, must be called before any connection is created"""
+        with Reactor.instance_lock:
+            if Reactor.instance is not None:
+                return False
+            Reactor.instance = reactor
+            reactor.start()
+            return True
+
+    def in_reactor_thread(self) -> bool:
+        return threading.current_thread() is self
+
+    @abc.abstractmethod
+    def call_soon(self, callback: Callable[[], None]) -> None:
+        pass
+
+    @abc.abstractmethod
+    def call_later(self, delay: float, callback: Callable[[], None]) -> "Reactor.Timer":
+        pass
+
+    @abc.abstractmethod
+    def run_in_executor(self, task: Callable[..., Any], *args: Any) -> None:
+        pass
+
+    @abc.abstractmethod
+    def register(self, connection: ReactorConnection) -> None:
+        pass
+
+    @abc.abstractmethod
+    def unregister(self, connection: ReactorConnection) -> None:
+        pass
+
+
+class SelectorReactor(Reactor):
+    """Reactor implemented with a selector (epoll, kqueue, etc. depending on the platform)"""
+
+    def __init__(self) -> None:
+        super().__init__(name="SelectorReactorThread", daemon=True)
+        self.__selector = selectors.DefaultSelector()
+        self.__wakeup_reader, self.__wakeup_writer = socket.socketpair()
+        self.__wakeup_reader.setblocking(False)
+        self.__wakeup_writer.setblocking(False)
+        self.__selector.register(self.__wakeup_reader, selectors.EVENT_READ, None)
+        self.__pending_calls: Deque[Callable[[], None]] = deque()
+        self.__pending_calls_lock = threading.Lock()
+        self.__timers: List[Tuple[float, int, Reactor.Timer]] = []
+        self.__timers_sequence = itertools.count()
+        self.__connections: MutableMapping[int, ReactorConnection] = {}
+        self.__executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="ReactorWorker")
+
+    def call_soon(self, callback: Callable[[], None]) -> None:
+        with self.__pending_calls_lock:
+            self.__pending_calls.append(callback)
+        if not self.in_reactor_thread():
+            try:
+                self.__wakeup_writer.send(b"\0")
+            except (BlockingIOError, InterruptedError):
+                pass  # The loop is already going to wake up
+
+    def call_later(self, delay: float, callback: Callable[[], None]) -> "Reactor.Timer":
+        timer = Reactor.Timer(callback)
+
+        def schedule():
+            heapq.heappush(self.__timers, (time.monotonic() + delay, next(self.__timers_sequence), timer))
+
+        if self.in_reactor_thread():
+            schedule()
+        else:
+            self.call_soon(schedule)
+        return timer
+
+    def run_in_executor(self, task: Callable[..., Any], *args: Any) -> None:
+        self.__executor.submit(task, *args)
+
+    def register(self, connection: ReactorConnection) -> None:
+        self.__run_in_loop(lambda: self.__register(connection))
+
+    def unregister(self, connection: ReactorConnection) -> None:
+        self.__run_in_loop(lambda: self.__unregister(connection))
+
+    def run(self) -> None:
+        while True:
+            self.__run_pending_calls()
+            timeout = None
+            if self.__pending_calls:
+                timeout = 0.0
+            elif self.__timers:
+                timeout = max(0.0, self.__timers[0][0] - time.monotonic())
+            for key, _ in self.__selector.select(timeout):
+                if key.data is None:
+                    self.__drain_wakeup()
+                    continue
+                connection: ReactorConnection = key.data
+                try:
+                    connection.handle_readable()
+                except Exception as e:
+                    gLogger.error(f"Unhandled error in connection {connection}: {e}")
+            self.__run_timers()
+
+    def __run_in_loop(self, callback: Callable[[], None]) -> None:
+        """Runs a callback in the loop and waits for it to finish"""
+        if self.in_reactor_thread():
+            callback()
+            return
+        done = threading.Event()
+
+        def wrapper():
+            try:
+                callback()
+            finally:
+                done.set()
+
+        self.call_soon(wrapper)
+        done.wait()
+
+    def __register(self, connection: ReactorConnection) -> None:
+        fileno = connection.fileno()
+        if fileno < 0 or self.__connections.get(fileno) is connection:
+            return
+        self.__unregister(connection)
+        if fileno in self.__connections:  # The descriptor was reused
+            del self.__connections[fileno]
+            self.__selector.unregister(fileno)
+        self.__selector.register(fileno, selectors.EVENT_READ, connection)
+        self.__connections[fileno] = connection
+
+    def __unregister(self, connection: ReactorConnection) -> None:
+        for fileno, registered in list(self.__connections.items()):
+            if registered is connection:
+                del self.__connections[fileno]
+                try:
+                    self.__selector.unregister(fileno)
+                except (KeyError, ValueError):
+                    pass
+
+    def __run_pending_calls(self) -> None:
+        with self.__pending_calls_lock:
+            calls = list(self.__pending_calls)
+            self.__pending_calls.clear()
+        for call in calls:
+            try:
+                call()
+            except Exception as e:
+                gLogger.error(f"Unhandled error in reactor call: {e}")
+
+    def __run_timers(self) -> None:
+        now = time.monotonic()
+        while self.__timers and self.__timers[0][0] <= now:
+            _, _, timer = heapq.heappop(self.__timers)
+            if timer.cancelled:
+                continue
+            try:
+                timer.callback()
+            except Exception as e:
+                gLogger.error(f"Unhandled error in reactor timer: {e}")
+
+    def __drain_wakeup(self) -> None:
+        try:
+            while self.__wakeup_reader.recv(4096):
+                pass
+        except (BlockingIOError, InterruptedError):
+            pass
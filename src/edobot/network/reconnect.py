@@ -0,0 +1,171 @@
+import logging
+import random
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Optional
+
+from .reactor import Reactor
+
+__all__ = ["Backoff", "ReconnectScheduler", "tcp_probe"]
+
+gLogger = logging.getLogger(f"edobot.{__name__}")
+
+gReconnectExecutor: Optional[ThreadPoolExecutor] = None
+gReconnectExecutorLock = threading.Lock()
+
+
+def _get_reconnect_executor() -> ThreadPoolExecutor:
+    global gReconnectExecutor
+    with gReconnectExecutorLock:
+        if gReconnectExecutor is None:
+            gReconnectExecutor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="Reconnect")
+        return gReconnectExecutor
+
+
+def tcp_probe(host: str, port: int, timeout: float = 0.5) -> bool:
+    """Checks if something is listening in host:port, much cheaper than a full handshake"""
+    if not host or not port:
+        return False
+    try:
+        with socket.create_connection((host, port), timeout=timeout):
+            return True
+    except OSError:
+        return False
+
+
+class Backoff:
+    """Exponential backoff capped to a maximum delay, with jitter so connections don't retry in lockstep"""
+
+    def __init__(self, initial: float = 1, maximum: float = 60, factor: float = 2) -> None:
+        self.initial = initial
+        self.maximum = maximum
+        self.factor = factor
+        self.attempts = 0
+
+    def next_delay(self) -> float:
+        delay = min(self.maximum, self.initial * self.factor**self.attempts)
+        self.attempts += 1
+        return delay / 2 + random.uniform(0, delay / 2)
+
+    def reset(self) -> None:
+        self.attempts = 0
+
+
+class ReconnectScheduler:
+    """Retries a connection on the shared reactor until it succeeds.
+
+    The delays are timers of the shared reactor and the attempts run in their own pool, so a slow handshake
+    doesn't hold the reactor workers. Each attempt first checks the optional readiness probe so a closed port
+    only costs a TCP connect. retry_now() is the hint to try again right away, e.g. when the settings
+    change, and pause() stops retrying until that hint arrives (e.g. after a rejected password).
+
+    The backoff is only reset once a connection stays up for STABLE_CONNECTION_SECONDS, so a server that
+    accepts and closes right away is still retried with growing delays.
+    """
+
+    STABLE_CONNECTION_SECONDS = 30
+
+    def __init__(
+        self,
+        name: str,
+        attempt: Callable[[], bool],
+        probe: Optional[Callable[[], bool]] = None,
+        backoff: Optional[Backoff] = None,
+    ) -> None:
+        self.name = name
+        self.attempt = attempt  # Returns True once connected
+        self.probe = probe
+        self.backoff = backoff or Backoff()
+        self.reactor = Reactor.shared()
+        self.attempts = 0
+        self.__lock = threading.Lock()
+        self.__timer: Optional[Reactor.Timer] = None
+        self.__running_attempt = False
+        self.__retry_requested = False
+        self.__paused = False
+        self.__stopped = False
+        self.__connected_since: Optional[float] = None
+
+    def schedule(self) -> None:
+        """Schedules the next attempt after the backoff delay, e.g. after the connection was closed"""
+        with self.__lock:
+            if self.__stopped or self.__paused or self.__timer is not None or self.__running_attempt:
+                return
+            if self.__connected_since is not None:
+                if time.monotonic() - self.__connected_since >= ReconnectScheduler.STABLE_CONNECTION_SECONDS:
+                    self.backoff.reset()
+                self.__connected_since = None
+            delay = self.backoff.next_delay()
+            gLogger.info(f"{self.name}: retrying connection in {delay:.1f}s")
+            self.__timer = self.reactor.call_later(delay, self.__on_timer)
+
+    def retry_now(self) -> None:
+        with self.__lock:
+            if self.__stopped:
+                return
+            self.__paused = False
+            self.backoff.reset()
+            if self.__timer is not None:
+                self.__timer.cancel()
+                self.__timer = None
+            if self.__running_attempt:
+                self.__retry_requested = True
+                return
+            self.__running_attempt = True
+        _get_reconnect_executor().submit(self.__run_attempt)
+
+    def pause(self) -> None:
+        with self.__lock:
+            self.__paused = True
+            if self.__timer is not None:
+                self.__timer.cancel()
+                self.__timer = None
+
+    def reset(self) -> None:
+        """Makes the next disconnection start with the shortest delay"""
+        with self.__lock:
+            self.backoff.reset()
+            self.__connected_since = None
+
+    def stop(self) -> None:
+        with self.__lock:
+            self.__stopped = True
+            if self.__timer is not None:
+                self.__timer.cancel()
+                self.__timer = None
+
+    def is_stopped(self) -> bool:
+        return self.__stopped
+
+    def __on_timer(self) -> None:
+        with self.__lock:
+            self.__timer = None
+            if self.__stopped or self.__paused or self.__running_attempt:
+                return
+            self.__running_attempt = True
+        _get_reconnect_executor().submit(self.__run_attempt)
+
+    def __run_attempt(self) -> None:  # Runs in the reconnect pool
+        while True:
+            connected = False
+            try:
+                self.attempts += 1
+                if self.probe is None or self.probe():
+                    connected = self.attempt()
+            except Exception as e:
+                gLogger.error(f"{self.name}: error connecting: {e}")
+            with self.__lock:
+                self.__running_attempt = False
+                if connected:
+                    self.__connected_since = time.monotonic()
+                retry = self.__retry_requested and not self.__stopped
+                self.__retry_requested = False
+                if retry:
+                    self.__running_attempt = True
+            if connected and not retry:
+                return
+            if not retry:
+                self.schedule()
+                return
@@ -1,21 +1,28 @@
 import logging
-import socket
 import threading
-import time
-from typing import Callable
+from typing import Callable, Optional
+
+from .reconnect import ReconnectScheduler, tcp_probe
 
 gLogger = logging.getLogger(f"edobot.{__name__}")
 
 __all__ = ["SocketConnector"]
 
 
-class SocketConnector(threading.Thread):
+class SocketConnector:
+    """Waits until host:port accepts connections and then calls retry_connection_cb.
+
+    The callback returns True once connected, otherwise it's called again with a capped backoff.
+    """
+
     def __init__(self, host: str, port: int, retry_connection_cb: Callable[[], bool]):
-        super().__init__(name=f"{self.__class__.__name__}Thread")
+        self.name = self.__class__.__name__
         self.host = host
         self.port = port
         self.retry_connection_cb = retry_connection_cb
         self.running = True
+        self.__finished = threading.Event()
+        self.__scheduler: Optional[ReconnectScheduler] = None
 
     def set_host(self, host: str):
         self.host = host
@@ -23,17 +30,38 @@ class SocketConnector(threading.Thread):
     def set_port(self, port: int):
         self.port = port
 
+    def start(self) -> None:
+        gLogger.info(f"Waiting connection from {self.host}:{self.port}")
+        self.__scheduler = ReconnectScheduler(self.name, self.__attempt, lambda: tcp_probe(self.host, self.port))
+        self.__scheduler.retry_now()
+
+    def retry_now(self) -> None:
+        """Hint to retry right away, e.g. after the connection settings changed"""
+        if self.__scheduler is not None:
+            self.__scheduler.retry_now()
+
+    def pause(self) -> None:
+        """Stops retrying until retry_now is called"""
+        if self.__scheduler is not None:
+            self.__scheduler.pause()
+
     def stop(self):
         self.running = False
+        if self.__scheduler is not None:
+            self.__scheduler.stop()
+        self.__finished.set()
 
-    def run(self):
-        gLogger.info(f"Waiting connection from {self.host}:{self.port}")
-        while self.running:
-            try:
-                if self.host and self.port:
-                    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-                    result = sock.connect_ex((self.host, self.port))
-                    if result == 0:
-                        self.running = not self.retry_connection_cb()
-            except socket.error:
-                time.sleep(1)
+    def join(self, timeout: Optional[float] = None) -> None:
+        self.__finished.wait(timeout)
+
+    def is_alive(self) -> bool:
+        return self.__scheduler is not None and not self.__finished.is_set()
+
+    def __attempt(self) -> bool:
+        if not self.running:
+            return True
+        if self.retry_connection_cb():
+            self.running = False
+            self.__finished.set()
+            return True
+        return False
@@ -0,0 +1,147 @@
+import sys
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Generic, Hashable, Iterator, List, Mapping, Optional, Tuple, TypeVar
+
+__all__ = ["TTLCache", "approximate_size"]
+
+K = TypeVar("K", bound=Hashable)
+V = TypeVar("V")
+
+
+def approximate_size(obj: Any) -> int:
+    """Shallow size of an object plus the size of its attributes, good enough to enforce memory caps"""
+    size = sys.getsizeof(obj)
+    attributes = getattr(obj, "__dict__", None)
+    if attributes is not None:
+        size += sys.getsizeof(attributes) + sum(sys.getsizeof(value) for value in attributes.values())
+    return size
+
+
+class TTLCache(Generic[K, V]):
+    """Thread safe cache with a time to live for each entry and least recently used eviction.
+
+    The cache is bounded by number of entries and, optionally, by the approximate memory used
+    by the values as reported by the sizeof function.
+    """
+
+    def __init__(
+        self,
+        ttl_seconds: float = 5 * 60,
+        max_entries: int = 10000,
+        max_bytes: Optional[int] = None,
+        sizeof: Callable[[V], int] = approximate_size,
+    ) -> None:
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max(1, max_entries)
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.current_bytes = 0
+        # key: (expire time, size, value)
+        self.__entries: OrderedDict[K, Tuple[float, int, V]] = OrderedDict()
+        self.__lock = threading.RLock()
+
+    def get(self, key: K, default: Optional[V] = None) -> Optional[V]:
+        with self.__lock:
+            entry = self.__entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            if time.monotonic() > entry[0]:
+                self.__remove(key)
+                self.misses += 1
+                return default
+            self.__entries.move_to_end(key)
+            self.hits += 1
+            return entry[2]
+
+    def set(self, key: K, value: V, ttl_seconds: Optional[float] = None) -> None:
+        size = self.sizeof(value) if self.max_bytes is not None else 0
+        expire_time = time.monotonic() + (self.ttl_seconds if ttl_seconds is None else ttl_seconds)
+        with self.__lock:
+            if key in self.__entries:
+                self.__remove(key)
+            self.__entries[key] = (expire_time, size, value)
+            self.current_bytes += size
+            self.__evict()
+
+    def setdefault(self, key: K, value: V, ttl_seconds: Optional[float] = None) -> V:
+        with self.__lock:
+            current = self.get(key)
+            if current is not None:
+                return current
+            self.set(key, value, ttl_seconds)
+            return value
+
+    def pop(self, key: K, default: Optional[V] = None) -> Optional[V]:
+        with self.__lock:
+            if key not in self.__entries:
+                return default
+            return self.__remove(key)
+
+    def resize(self, key: K) -> None:
+        """Recalculates the size of an entry whose value was mutated in place"""
+        with self.__lock:
+            entry = self.__entries.get(key)
+            if entry is None or self.max_bytes is None:
+                return
+            size = self.sizeof(entry[2])
+            self.current_bytes += size - entry[1]
+            self.__entries[key] = (entry[0], size, entry[2])
+            self.__evict()
+
+    def remaining_ttl(self, key: K) -> Optional[float]:
+        """Remaining seconds for an entry to expire, None if it's not cached"""
+        with self.__lock:
+            entry = self.__entries.get(key)
+            return None if entry is None else entry[0] - time.monotonic()
+
+    def items(self) -> List[Tuple[K, V]]:
+        now = time.monotonic()
+        with self.__lock:
+            return [(key, entry[2]) for key, entry in self.__entries.items() if now <= entry[0]]
+
+    def clear(self) -> None:
+        with self.__lock:
+            self.__entries.clear()
+            self.current_bytes = 0
+
+    def stats(self) -> Mapping[str, int]:
+        with self.__lock:
+            return {
+                "entries": len(self.__entries),
+                "bytes": self.current_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+    def __contains__(self, key: K) -> bool:
+        with self.__lock:
+            entry = self.__entries.get(key)
+            return entry is not None and time.monotonic() <= entry[0]
+
+    def __len__(self) -> int:
+        return len(self.__entries)
+
+    def __iter__(self) -> Iterator[K]:
+        return iter([key for key, _ in self.items()])
+
+    def __remove(self, key: K) -> V:
+        _, size, value = self.__entries.pop(key)
+        self.current_bytes -= size
+        return value
+
+    def __evict(self) -> None:
+        while self.__entries and (len(self.__entries) > self.max_entries or self.__over_memory_cap()):
+            self.__remove(next(iter(self.__entries)))
+            self.evictions += 1
+        if not self.__entries:
+            self.current_bytes = 0
+
+    def __over_memory_cap(self) -> bool:
+        return self.max_bytes is not None and self.current_bytes > self.max_bytes
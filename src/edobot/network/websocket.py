@@ -1,22 +1,133 @@
 import abc
 import logging
 import re
+import selectors
+import ssl
 import sys
 import threading
 import time
-from typing import Optional, final
+from typing import List, Optional, Union, final
 
 import websocket
 
-__all__ = ["WebSocket"]
+from .reactor import Reactor
+from .reconnect import ReconnectScheduler, tcp_probe
+
+__all__ = ["FrameStream", "WebSocket"]
 
 gLogger = logging.getLogger(f"edobot.{__name__}")
 gWebSocketRegex = re.compile(r"^(wss?:\/\/)([0-9]{1,3}(?:\.[0-9]{1,3}){3}|[a-zA-Z0-9-\.]+)(?::([0-9]{1,5}))?")
 
 
-class WebSocket(threading.Thread, abc.ABC):
+class FrameStream:
+    """Non-blocking frame reader and writer over an already connected websocket.
+
+    read() only takes the bytes the socket already has and keeps partial frames (or TLS records) buffered
+    until the rest arrives, so the reactor thread never waits for the network. Writes are serialized and
+    only wait, up to the socket timeout, when the kernel buffer is full.
+    """
+
+    READ_SIZE = 64 * 1024
+
+    def __init__(self, ws: websocket.WebSocket, timeout: Optional[float]) -> None:
+        self.ws = ws
+        self.timeout = timeout
+        self.sock = ws.sock
+        self.sock.setblocking(False)
+        self.__buffer = bytearray()
+        self.__fragments: List[bytes] = []
+        self.__write_lock = threading.Lock()
+
+    def read(self) -> List[str]:
+        """Returns the complete messages received so far, raises WebSocketConnectionClosedException when closed"""
+        while True:
+            try:
+                data = self.sock.recv(FrameStream.READ_SIZE)
+            except (BlockingIOError, ssl.SSLWantReadError, ssl.SSLWantWriteError):
+                break
+            if not data:
+                raise websocket.WebSocketConnectionClosedException("Connection closed by the server")
+            self.__buffer += data
+        return self.__parse_frames()
+
+    def send(self, message: Union[str, bytes], opcode: int = websocket.ABNF.OPCODE_TEXT) -> None:
+        data = websocket.ABNF.create_frame(message, opcode).format()
+        view = memoryview(data)
+        deadline = None if self.timeout is None else time.monotonic() + self.timeout
+        with self.__write_lock:
+            while view:
+                try:
+                    sent = self.sock.send(view)
+                except (BlockingIOError, ssl.SSLWantWriteError, ssl.SSLWantReadError):
+                    remaining = None if deadline is None else deadline - time.monotonic()
+                    if remaining is not None and remaining <= 0:
+                        raise websocket.WebSocketTimeoutException("Timed out sending a frame")
+                    with selectors.DefaultSelector() as selector:
+                        selector.register(self.sock, selectors.EVENT_WRITE)
+                        selector.select(remaining)
+                    continue
+                view = view[sent:]
+
+    def __parse_frames(self) -> List[str]:
+        messages: List[str] = []
+        buffer = self.__buffer
+        available = len(buffer)
+        offset = 0
+        while available - offset >= 2:
+            first, second = buffer[offset], buffer[offset + 1]
+            length = second & 0x7F
+            header = 2
+            if length == 126:
+                header = 4
+            elif length == 127:
+                header = 10
+            masked = second & 0x80
+            if masked:
+                header += 4
+            if available - offset < header:
+                break
+            if length == 126:
+                length = int.from_bytes(buffer[offset + 2 : offset + 4], "big")
+            elif length == 127:
+                length = int.from_bytes(buffer[offset + 2 : offset + 10], "big")
+            if available - offset < header + length:
+                break  # Wait for the rest of the frame
+            payload = bytes(buffer[offset + header : offset + header + length])
+            if masked:  # Servers don't mask their frames, but it's cheap to support
+                payload = websocket.ABNF.mask(bytes(buffer[offset + header - 4 : offset + header]), payload)
+            offset += header + length
+            message = self.__handle_frame(bool(first & 0x80), first & 0x0F, payload)
+            if message is not None:
+                messages.append(message)
+        del buffer[:offset]
+        return messages
+
+    def __handle_frame(self, fin: bool, opcode: int, payload: bytes) -> Optional[str]:
+        if opcode in (websocket.ABNF.OPCODE_TEXT, websocket.ABNF.OPCODE_BINARY, websocket.ABNF.OPCODE_CONT):
+            if opcode != websocket.ABNF.OPCODE_CONT:
+                self.__fragments.clear()
+            self.__fragments.append(payload)
+            if not fin:
+                return None
+            data = b"".join(self.__fragments)
+            self.__fragments.clear()
+            return data.decode("utf-8", errors="replace")
+        if opcode == websocket.ABNF.OPCODE_PING:
+            self.send(payload, websocket.ABNF.OPCODE_PONG)
+        elif opcode == websocket.ABNF.OPCODE_CLOSE:
+            raise websocket.WebSocketConnectionClosedException("Connection closed by the server")
+        return None
+
+
+class WebSocket(abc.ABC):
+    """WebSocket connection driven by the shared Reactor.
+
+    handle_message is called from the reactor thread as soon as a whole message is received, so it must not
+    block. The start/stop/join/is_alive methods keep the interface the connections had when they were threads.
+    """
+
     def __init__(self, url: str, timeout: Optional[float] = None) -> None:
-        super().__init__(name=f"{self.__class__.__name__}Thread")
+        self.name = f"{self.__class__.__name__}Connection"
 
         self.url = url
 
@@ -30,9 +141,21 @@ class WebSocket(threading.Thread, abc.ABC):
         self.running = True
         self.connected = False
         self.retry_enabled = True
+        # Seconds between calls to ping(), None to never call it
+        self.ping_interval: Optional[float] = None
 
+        self.timeout = timeout
         self.socket: websocket.WebSocket = websocket.WebSocket()
         self.socket.settimeout(timeout)
+        self.frames: Optional[FrameStream] = None
+
+        self.reactor = Reactor.shared()
+        self.__started = False
+        self.__stopped = threading.Event()
+        self.reconnector = ReconnectScheduler(
+            self.name, self.__reconnect, lambda: tcp_probe(self.host, self.port, timeout or 1)
+        )
+        self.__ping_timer: Optional[Reactor.Timer] = None
 
     @abc.abstractmethod
     def handle_message(self, message: str) -> None:
@@ -46,61 +169,130 @@ class WebSocket(threading.Thread, abc.ABC):
 
     def connect(self) -> None:
         try:
-            self.socket.connect(self.url)
+            self.socket.connect(self.url)  # The handshake blocks, it's done before the socket is registered
+            self.frames = FrameStream(self.socket, self.timeout)
             self.connected = True
         except websocket.WebSocketException:
             self.connected = False
         except Exception as e:
             gLogger.error(f"Unknown error: {e}")
             self.connected = False
+        if self.connected and self.__started and self.running:
+            self.reactor.register(self)
 
     def disconnect(self) -> None:
+        self.reactor.unregister(self)
+        self.frames = None
         try:
-            self.socket.close()
-        except websocket.WebSocketException:
+            self.socket.close(timeout=0)  # Sends the close frame without waiting for the answer
+        except (OSError, websocket.WebSocketException):
             pass
         self.connected = False
 
+    def start(self) -> None:
+        self.__started = True
+        self.__stopped.clear()
+        if self.connected:
+            self.reactor.register(self)
+        elif self.retry_enabled:
+            self.reconnector.schedule()
+        self.__schedule_ping()
+
     def stop(self) -> None:
-        if self.is_alive():
-            self.running = False
+        self.running = False
+        self.reconnector.stop()
+        if self.__ping_timer is not None:
+            self.__ping_timer.cancel()
         self.disconnect()
+        self.__stopped.set()
+
+    def join(self, timeout: Optional[float] = None) -> None:
+        if self.__started and not self.reactor.in_reactor_thread():
+            self.__stopped.wait(timeout)
+
+    def is_alive(self) -> bool:
+        return self.__started and not self.__stopped.is_set()
 
     def ping(self) -> None:
         pass
 
     @final
     def send(self, message: str):
-        self.socket.send(message)
+        frames = self.frames
+        if frames is None:
+            raise websocket.WebSocketConnectionClosedException("The connection is not established")
+        frames.send(message)
 
     @final
-    def run(self):
-        reconnect_time = 1
-        while self.running:
-            if not self.connected:
-                time.sleep(0.1)
-                continue
-            message = ""
-            try:
-                self.ping()
-                message: str = self.socket.recv()
-                if message:
-                    self.handle_message(message)
-            except (OSError, websocket.WebSocketConnectionClosedException) as e:
-                gLogger.info(f"Connection closed for endpoint {self.host}: {e}")
-                self.connected = False
-                self.connection_closed()
-                if self.retry_enabled and self.running:
-                    gLogger.info(f"Retrying connection in {reconnect_time}s")
-                    time.sleep(reconnect_time)
-                    self.connect()
-                    if not self.connected:
-                        reconnect_time *= 2
-                    else:
-                        reconnect_time = 1
-            except websocket.WebSocketTimeoutException:
-                continue
-
-    def __del__(self):
-        if self.is_alive():
-            self.join()
+    def replace_socket(self, new_socket: websocket.WebSocket, frames: Optional[FrameStream] = None) -> None:
+        """Moves the connection to an already connected socket, closing the current one.
+
+        frames is the stream already reading from the new socket, if any, so its buffered data is kept.
+        """
+        old_socket = self.socket
+        self.reactor.unregister(self)
+        self.socket = new_socket
+        self.frames = frames if frames is not None else FrameStream(new_socket, self.timeout)
+        self.connected = True
+        if self.__started and self.running:
+            self.reactor.register(self)
+        try:
+            old_socket.close(timeout=0)
+        except (OSError, websocket.WebSocketException):
+            pass
+
+    @final
+    def force_reconnect(self) -> None:
+        """Drops a connection known to be dead and connects again after the reconnection delay"""
+        if not self.connected:
+            return
+        gLogger.info(f"Forcing reconnection to endpoint {self.host}")
+        self.disconnect()
+        self.connection_closed()
+        if self.retry_enabled and self.running:
+            self.reconnector.schedule()
+
+    @final
+    def fileno(self) -> int:
+        sock = self.socket.sock
+        return sock.fileno() if sock is not None else -1
+
+    @final
+    def handle_readable(self) -> None:  # Runs in the reactor thread
+        frames = self.frames
+        if frames is None:
+            return
+        try:
+            messages = frames.read()
+        except (OSError, websocket.WebSocketException) as e:
+            gLogger.info(f"Connection closed for endpoint {self.host}: {e}")
+            self.reactor.unregister(self)
+            self.frames = None
+            self.connected = False
+            self.connection_closed()
+            if self.retry_enabled and self.running:
+                self.reconnector.schedule()
+            return
+        for message in messages:
+            if message:
+                self.handle_message(message)
+
+    def __reconnect(self) -> bool:  # Runs in the reconnect pool, the handshake must not block the loop
+        if not self.running or self.connected:
+            return True
+        self.connect()
+        return self.connected or not self.retry_enabled
+
+    def __schedule_ping(self) -> None:
+        if self.ping_interval is None or not self.running:
+            return
+
+        def ping():
+            if self.connected:
+                try:
+                    self.ping()
+                except (OSError, websocket.WebSocketException) as e:
+                    gLogger.warning(f"Error sending ping to {self.host}: {e}")
+            self.__schedule_ping()
+
+        self.__ping_timer = self.reactor.call_later(self.ping_interval, ping)
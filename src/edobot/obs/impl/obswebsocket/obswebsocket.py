@@ -1,5 +1,4 @@
 import logging
-import time
 from typing import Any, List, Mapping, Optional, Union
 
 import obsws_python as obs
@@ -14,6 +13,8 @@ gLogger = logging.getLogger(f"edobot.{__name__}")
 
 
 class OBSWebSocket(OBSInterface):
+    CONNECT_TIMEOUT_SECONDS = 5
+
     def __init__(self, host: str, port: int, password: str):
         self.host = host
         self.port = port
@@ -24,12 +25,14 @@ class OBSWebSocket(OBSInterface):
         self.client: Optional[obs.ReqClient] = None
         self.connector: Optional[SocketConnector] = None
 
-    def start_obs_connection(self) -> bool:  # Runs in OBSConnector thread
+    def start_obs_connection(self) -> bool:  # Runs in the reconnect pool
         if self.conected:
             return True
         try:
             gLogger.info("Trying to connect to OBS")
-            self.client: Optional[obs.ReqClient] = obs.ReqClient(host=self.host, port=self.port, password=self.password)
+            self.client = obs.ReqClient(
+                host=self.host, port=self.port, password=self.password, timeout=OBSWebSocket.CONNECT_TIMEOUT_SECONDS
+            )
             version = self.client.get_version()
             if not hasattr(version, "obs_version"):
                 return False
@@ -39,8 +42,8 @@ class OBSWebSocket(OBSInterface):
             return True
         except Exception as e:
             gLogger.error("Error authenticating to OBS, please check your configuration. [" + str(e) + "]")
-            while self.waiting_password:
-                time.sleep(1)
+            if self.waiting_password and self.connector is not None:
+                self.connector.pause()  # set_config retries with the new password
             return self.exit_requested
 
     # TODO: Handle random disconnection
@@ -69,6 +72,7 @@ class OBSWebSocket(OBSInterface):
         if self.connector:
             self.connector.set_host(self.host)
             self.connector.set_port(self.port)
+            self.connector.retry_now()
 
     def is_connected(self) -> bool:
         if self.client is None:
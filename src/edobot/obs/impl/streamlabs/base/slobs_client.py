@@ -14,6 +14,8 @@ gLogger = logging.getLogger(f"edobot.{__name__}")
 
 
 class SLOBSClient(WebSocket):
+    API_BUSY_RETRY_SECONDS = 2
+
     def __init__(self, host: str, port: int, token: str) -> None:
         super().__init__(f"ws://{host}:{port}/api/websocket", 10)
 
@@ -25,7 +27,8 @@ class SLOBSClient(WebSocket):
         self.request_id = 1
         self.answers: MutableMapping[int, Any] = {}
 
-        self.api_busy_lock = threading.Lock()
+        # The requests wait until this time after the API reports it's busy, handle_message must not block the reactor
+        self.api_busy_until = 0.0
 
         self.disconnected_event = Signal()
 
@@ -39,8 +42,11 @@ class SLOBSClient(WebSocket):
 
     def send_and_wait_jsonrpc(self, message: JSONRPCMessage, optional: bool = True) -> Any:
         while self.running:
-            with self.api_busy_lock:
-                super().send(message.json())
+            busy_seconds = self.api_busy_until - time.monotonic()
+            if busy_seconds > 0:
+                time.sleep(busy_seconds)
+                continue
+            super().send(message.json())
             response = self.__wait_message(message.get_id())
             if optional or response is not None:
                 return response
@@ -61,7 +67,7 @@ class SLOBSClient(WebSocket):
     def __wait_message(self, message_id: int) -> Any:
         timeout = time.time() + 60  # Timeout = 60s
         while time.time() < timeout and self.running:
-            if self.api_busy_lock.locked():
+            if time.monotonic() < self.api_busy_until:
                 return None
             if message_id in self.answers:
                 data = self.answers.pop(message_id)
@@ -79,8 +85,8 @@ class SLOBSClient(WebSocket):
             if "error" in data:
                 error = data["error"]
                 if "API server is busy" in error["message"]:
-                    with self.api_busy_lock:
-                        time.sleep(2)
+                    self.api_busy_until = time.monotonic() + SLOBSClient.API_BUSY_RETRY_SECONDS
+                    continue  # The waiting request sees the busy time and sends it again
             if "id" in data:
                 self.answers[data["id"]] = data
             else:
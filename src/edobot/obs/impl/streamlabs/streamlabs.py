@@ -1,5 +1,4 @@
 import logging
-import time
 from typing import Any, List, Mapping, Optional, Union
 
 from edobot.network.socket_connector import SocketConnector
@@ -24,7 +23,7 @@ class StreamlabsOBS(OBSInterface):
         self.client: Optional[SLOBSClient] = None
         self.connector: Optional[SocketConnector] = None
 
-    def start_obs_connection(self) -> bool:  # Runs in OBSConnector thread
+    def start_obs_connection(self) -> bool:  # Runs in the reconnect pool
         if self.conected:
             return True
         try:
@@ -40,12 +39,9 @@ class StreamlabsOBS(OBSInterface):
         except Exception as e:
             if str(e) == "Authentication Failed.":
                 gLogger.error("Error authenticating to OBS, please check your configuration")
-                while self.waiting_token:
-                    time.sleep(1)
+                if self.waiting_token and self.connector is not None:
+                    self.connector.pause()  # set_config retries with the new token
             return self.exit_requested
-        except Exception:
-            time.sleep(1)
-            return False
 
     def obs_disconnected(self):
         self.conected = False
@@ -72,6 +68,7 @@ class StreamlabsOBS(OBSInterface):
         if self.connector:
             self.connector.set_host(self.host)
             self.connector.set_port(self.port)
+            self.connector.retry_now()
 
     def is_connected(self) -> bool:
         return self.client is not None and self.client.is_alive() is not None and self.client.running and self.conected
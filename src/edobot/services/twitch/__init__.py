@@ -1,8 +1,8 @@
 from . import events
-from .chat import Chat
+from .chat import Chat, MessagePriority
 from .eventsub import EventSub
 from .irc_tags import PrivateMsgTags
 from .pubsub import PubSub
 from .service import Service
 
-__all__ = ["events", "Chat", "PrivateMsgTags", "PubSub", "EventSub", "Service"]
+__all__ = ["events", "Chat", "MessagePriority", "PrivateMsgTags", "PubSub", "EventSub", "Service"]
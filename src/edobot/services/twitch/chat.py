@@ -1,14 +1,15 @@
 import logging
-import time
 from typing import Any, Callable, List, Mapping, Optional
 
 from edobot.model import EventType
 from edobot.network import WebSocket
 
+from .chat_queue import ChatQueue, MessagePriority
 from .events import RaidEvent
+from .irc_parser import IRCMessage, parse_irc_line
 from .irc_tags import PrivateMsgTags
 
-__all__ = ["Chat", "PrivateMsgTags"]
+__all__ = ["Chat", "MessagePriority", "PrivateMsgTags"]
 
 gLogger = logging.getLogger(f"edobot.{__name__}")
 
@@ -17,7 +18,11 @@ class Chat(WebSocket):
     MessageCallable = Callable[[str, PrivateMsgTags, str], None]
     EventCallable = Callable[[EventType, Any], None]
 
-    def __init__(self, nickname: str, password: str, channel_name: str):
+    # Commands dropped by the parser before splitting their tags
+    IGNORED_COMMANDS = frozenset(["JOIN", "PART", "353", "366", "372", "375", "376", "CAP"])
+    DEPRECATED_TAGS = frozenset(["subscriber", "turbo", "user-type"])
+
+    def __init__(self, nickname: str, password: str, channel_name: str, verified: bool = False):
         super().__init__("wss://irc-ws.chat.twitch.tv", timeout=1)
 
         self.nickname = nickname.lower()
@@ -27,6 +32,15 @@ class Chat(WebSocket):
         self.has_started = False
         self.subscribers: List[Chat.MessageCallable] = []
         self.subscribers_events: List[Chat.EventCallable] = []
+        self.outbound = ChatQueue(self.send, verified=verified)
+        self.__handlers: Mapping[str, Callable[[IRCMessage], None]] = {
+            "PRIVMSG": self.__handle_privmsg,
+            "USERNOTICE": self.__handle_usernotice,
+            "USERSTATE": self.__handle_userstate,
+            "PING": self.__handle_ping,
+            "NOTICE": self.__handle_notice,
+            "001": self.__handle_welcome,
+        }
 
     def start(self) -> None:
         self.connect()
@@ -48,6 +62,10 @@ class Chat(WebSocket):
                 # Join the desired channel
                 self.send(f"JOIN #{self.channel_name}")
 
+    def stop(self) -> None:
+        self.outbound.close()
+        super().stop()
+
     def disconnect(self) -> None:
         super().disconnect()
         self.subscribers.clear()
@@ -58,58 +76,64 @@ class Chat(WebSocket):
     def subscribe_events(self, subscriber: EventCallable):
         self.subscribers_events.append(subscriber)
 
-    def send_message(self, message: str) -> None:
-        while self.running:
-            try:
-                self.send(f"PRIVMSG #{self.channel_name} :{message}")
-                break
-            except Exception as e:
-                gLogger.error(f"Error sending message: {e}")
-                time.sleep(0.1)
+    def send_message(self, message: str, priority: MessagePriority = MessagePriority.NORMAL) -> None:
+        """Queues the message, it's sent as soon as the chat rate limits allow it"""
+        if self.running:
+            self.outbound.put(f"PRIVMSG #{self.channel_name} :{message}", priority)
+
+    def get_outbound_stats(self) -> Mapping[str, float]:
+        return self.outbound.stats()
 
     def handle_message(self, message: str):
-        lines = message.strip("\r\n").split("\r\n")
-
-        def process_tags(tags_str: str) -> Mapping[str, str]:
-            tags_dict = {}
-            for key_value in tags_raw.lstrip("@").split(";"):
-                key, value = key_value.split("=", 1)
-                if key not in ["subscriber", "turbo", "user-type"]:  # Ignore deprecated tags
-                    tags_dict[key.replace("-", "_")] = value
-            return tags_dict
-
-        for line in lines:
-            if line.find("PRIVMSG") > 0:
-                gLogger.debug(line)
-
-                raw_message_list = line.rsplit("PRIVMSG", 1)
-                tags_raw, sender_raw = raw_message_list[0].strip(" ").rsplit(" ", 1)
-                tags = PrivateMsgTags(**process_tags(tags_raw))
-                sender = sender_raw.split("!")[0].lstrip(":")
-
-                if not tags.display_name:  # display_name might be empty
-                    tags.display_name = sender
-
-                _, text = raw_message_list[1].split(":", 1)  # channel, text
-
-                sender = sender.strip("# ")
-                text = text.strip(" ")
-                for sub in self.subscribers:
-                    sub(sender, tags, text)
-            elif line.find("USERNOTICE") > 0:
-                raw_message_list = line.rsplit("USERNOTICE", 1)
-                tags_raw, sender_raw = raw_message_list[0].strip(" ").rsplit(" ", 1)
-                tags_dict = process_tags(tags_raw)
-                if tags_dict.get("msg_id") == "raid":
-                    for sub in self.subscribers_events:
-                        sub(EventType.RAID, RaidEvent(**tags_dict))
-            else:
-                if line.startswith("PING"):
-                    pong_host = line.split(" ")[1]
-                    self.send(f"PONG {pong_host}")
-                elif line.find("NOTICE") > 0 and line.endswith(":Login authentication failed") > 0:
-                    gLogger.critical(f"Error authenticating chat with Twitch. {line}")
-                    return
-                elif not self.has_started:
-                    gLogger.info("Chat connection completed")
-                    self.has_started = True
+        for line in message.split("\r\n"):
+            irc_message = parse_irc_line(line, Chat.IGNORED_COMMANDS)
+            if irc_message is None:
+                continue
+            handler = self.__handlers.get(irc_message.command)
+            if handler is not None:
+                handler(irc_message)
+
+    @staticmethod
+    def __get_tag_kwargs(irc_message: IRCMessage) -> Mapping[str, str]:
+        return {
+            key.replace("-", "_"): value for key, value in irc_message.tags.items() if key not in Chat.DEPRECATED_TAGS
+        }
+
+    def __handle_privmsg(self, irc_message: IRCMessage) -> None:
+        if len(irc_message.params) < 2:
+            return
+        gLogger.debug(f"{irc_message.prefix} PRIVMSG {irc_message.params}")
+        tags = PrivateMsgTags(irc_message.tags)
+        sender = irc_message.nickname
+        if not tags.display_name:  # display_name might be empty
+            tags.display_name = sender
+        text = irc_message.params[1].strip(" ")
+        for sub in self.subscribers:
+            sub(sender, tags, text)
+
+    def __handle_usernotice(self, irc_message: IRCMessage) -> None:
+        if irc_message.tags.get("msg-id") == "raid":
+            raid_event = RaidEvent(**self.__get_tag_kwargs(irc_message))
+            for sub in self.subscribers_events:
+                sub(EventType.RAID, raid_event)
+
+    def __handle_userstate(self, irc_message: IRCMessage) -> None:
+        # Sent after joining and after each message of the bot, tells if it can use the moderator limits
+        tags = irc_message.tags
+        badges = tags.get("badges", "")
+        self.outbound.set_moderator(
+            tags.get("mod") == "1" or any(x in badges for x in ("broadcaster/", "moderator/", "vip/"))
+        )
+
+    def __handle_ping(self, irc_message: IRCMessage) -> None:
+        pong_host = irc_message.params[0] if irc_message.params else "tmi.twitch.tv"
+        self.send(f"PONG :{pong_host}")
+
+    def __handle_notice(self, irc_message: IRCMessage) -> None:
+        if irc_message.params and irc_message.params[-1] == "Login authentication failed":
+            gLogger.critical(f"Error authenticating chat with Twitch. {irc_message.params[-1]}")
+
+    def __handle_welcome(self, irc_message: IRCMessage) -> None:
+        if not self.has_started:
+            gLogger.info("Chat connection completed")
+            self.has_started = True
@@ -0,0 +1,174 @@
+import logging
+import threading
+import time
+from collections import deque
+from enum import IntEnum
+from typing import Callable, Deque, List, Mapping, MutableMapping, Optional, Tuple
+
+from edobot.network import Reactor
+
+__all__ = ["ChatQueue", "MessagePriority"]
+
+gLogger = logging.getLogger(f"edobot.{__name__}")
+
+
+class MessagePriority(IntEnum):
+    HIGH = 0  # Replies to a user command
+    NORMAL = 1
+    LOW = 2  # Announcements that can wait
+
+
+class ChatQueue:
+    """Outbound chat messages waiting for the Twitch rate limits.
+
+    The messages are sent from the reactor by priority and then by arrival order, using a token bucket
+    sized for the bot status in the channel. A message identical to one already queued is merged with it.
+
+    https://dev.twitch.tv/docs/irc/#rate-limits
+    """
+
+    PERIOD_SECONDS = 30
+    USER_LIMIT = 20
+    MODERATOR_LIMIT = 100
+    VERIFIED_LIMIT = 7500
+    # Time to wait before retrying when the message can't be sent (e.g. while reconnecting)
+    RETRY_SECONDS = 1
+    LATENCY_SAMPLES = 100
+
+    def __init__(self, send: Callable[[str], None], max_size: int = 100, verified: bool = False) -> None:
+        self.send = send
+        self.max_size = max(1, max_size)
+        self.verified = verified
+        self.moderator = False
+        self.limit = self.__get_limit()
+        # Start with a single token, we don't know what was sent before connecting
+        self.tokens = 1.0
+        self.sent = 0
+        self.merged = 0
+        self.dropped = 0
+        self.reactor = Reactor.shared()
+        self.__last_refill = time.monotonic()
+        self.__lanes: List[Deque[Tuple[str, float]]] = [deque() for _ in MessagePriority]
+        self.__queued: MutableMapping[str, MessagePriority] = {}
+        self.__latencies: Deque[float] = deque(maxlen=ChatQueue.LATENCY_SAMPLES)
+        self.__lock = threading.Lock()
+        self.__timer: Optional[Reactor.Timer] = None
+        self.__closed = False
+
+    def put(self, message: str, priority: MessagePriority = MessagePriority.NORMAL) -> bool:
+        with self.__lock:
+            if self.__closed:
+                return False
+            queued_priority = self.__queued.get(message)
+            if queued_priority is not None:
+                self.merged += 1
+                if priority < queued_priority:  # Promote the queued message keeping its enqueue time
+                    lane = self.__lanes[queued_priority]
+                    entry = next(x for x in lane if x[0] == message)
+                    lane.remove(entry)
+                    self.__lanes[priority].append(entry)
+                    self.__queued[message] = priority
+                return False
+            if len(self.__queued) >= self.max_size:
+                self.__drop_lowest()
+            self.__lanes[priority].append((message, time.monotonic()))
+            self.__queued[message] = priority
+        self.reactor.call_soon(self.__drain)
+        return True
+
+    def set_moderator(self, moderator: bool) -> None:
+        with self.__lock:
+            if self.moderator == moderator:
+                return
+            self.moderator = moderator
+            self.limit = self.__get_limit()
+            gLogger.info(f"Chat rate limit set to {self.limit} messages every {ChatQueue.PERIOD_SECONDS}s")
+        self.reactor.call_soon(self.__drain)
+
+    def depth(self) -> int:
+        return len(self.__queued)
+
+    def stats(self) -> Mapping[str, float]:
+        with self.__lock:
+            latencies = sorted(self.__latencies)
+            result = {
+                "queued": len(self.__queued),
+                "sent": self.sent,
+                "merged": self.merged,
+                "dropped": self.dropped,
+                "limit": self.limit,
+            }
+        if latencies:
+            result["latency_avg"] = sum(latencies) / len(latencies)
+            result["latency_p95"] = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+            result["latency_max"] = latencies[-1]
+        return result
+
+    def close(self) -> None:
+        with self.__lock:
+            self.__closed = True
+            for lane in self.__lanes:
+                lane.clear()
+            self.__queued.clear()
+            if self.__timer is not None:
+                self.__timer.cancel()
+                self.__timer = None
+
+    def __get_limit(self) -> int:
+        if self.verified:
+            return ChatQueue.VERIFIED_LIMIT
+        return ChatQueue.MODERATOR_LIMIT if self.moderator else ChatQueue.USER_LIMIT
+
+    def __drop_lowest(self) -> None:
+        for lane in reversed(self.__lanes):
+            if lane:
+                message, _ = lane.popleft()
+                del self.__queued[message]
+                self.dropped += 1
+                gLogger.warning(f"Chat queue full, dropping message: {message}")
+                return
+
+    def __refill(self) -> None:
+        now = time.monotonic()
+        rate = self.limit / ChatQueue.PERIOD_SECONDS
+        self.tokens = min(float(self.limit), self.tokens + (now - self.__last_refill) * rate)
+        self.__last_refill = now
+
+    def __drain(self) -> None:  # Runs in the reactor thread
+        while True:
+            with self.__lock:
+                if self.__closed:
+                    return
+                lane = next((x for x in self.__lanes if x), None)
+                if lane is None:
+                    return
+                self.__refill()
+                if self.tokens < 1:
+                    wait = (1 - self.tokens) * ChatQueue.PERIOD_SECONDS / self.limit
+                    self.__schedule_drain(wait)
+                    return
+                message, enqueue_time = lane[0]
+            try:
+                self.send(message)
+            except Exception as e:
+                gLogger.warning(f"Error sending chat message, retrying in {ChatQueue.RETRY_SECONDS}s: {e}")
+                with self.__lock:
+                    self.__schedule_drain(ChatQueue.RETRY_SECONDS)
+                return
+            with self.__lock:
+                if lane and lane[0][0] == message:
+                    lane.popleft()
+                    self.__queued.pop(message, None)
+                self.tokens -= 1
+                self.sent += 1
+                self.__latencies.append(time.monotonic() - enqueue_time)
+
+    def __schedule_drain(self, delay: float) -> None:
+        if self.__timer is not None and not self.__timer.cancelled:
+            return
+
+        def drain():
+            self.__timer = None
+            self.__drain()
+
+        self.__timer = self.reactor.call_later(delay, drain)
@@ -1,14 +1,18 @@
 import json
 import logging
-from enum import Enum
-from typing import Any, Callable, List, Union
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Deque, List, Mapping, NamedTuple, Optional, Type, Union
+
+import websocket
 
 from edobot.model import EventType
-from edobot.network import WebSocket
+from edobot.network import FrameStream, Reactor, WebSocket
 
-from .eventsub_events.bits_badge_event import BitsBadgeEvent
-from .eventsub_events.bits_event import BitsEvent, BitsEventMeta
+from .eventsub_events.bits_event import BitsEvent
 from .eventsub_events.channel_points_event import ChannelPointsEvent
+from .eventsub_events.raid_event import RaidEvent
 from .eventsub_events.subscription_event import SubscriptionEvent
 from .service import Service
 
@@ -17,19 +21,69 @@ __all__ = ["EventSub"]
 gLogger = logging.getLogger(f"edobot.{__name__}")
 
 
-class EventSubEventType(Enum):
-    BITS_EVENT = "channel-bits-events-v2"
-    BITS_BADGE_EVENT = "channel-bits-badge-unlocks"
-    CHANNEL_POINTS_EVENT = "channel-points-channel-v1"
-    SUBSCRIPTION_EVENT = "channel-subscribe-events-v1"
-    # CHAT = "chat_moderator_actions.<user ID>.<channel ID>"
-    # WHISPERS = "whispers.<user ID>"
+class EventSubSubscription(NamedTuple):
+    event_type: EventType
+    event_class: Type[Any]
+    condition_field: str  # Condition field that receives the broadcaster id
+    version: str = "1"
 
 
 class EventSub(WebSocket):
-    EventMessages = Union[BitsBadgeEvent, BitsEvent, ChannelPointsEvent, SubscriptionEvent]
+    class Migration:
+        """Connection to the reconnect url, kept apart from the current one until it's welcomed"""
+
+        def __init__(
+            self,
+            socket: websocket.WebSocket,
+            frames: FrameStream,
+            on_message: Callable[[str], None],
+            on_closed: Callable[[], None],
+            start_time: float,
+        ) -> None:
+            self.socket = socket
+            self.frames = frames
+            self.on_message = on_message
+            self.on_closed = on_closed
+            self.start_time = start_time  # Time in which the reconnect was requested
+
+        def fileno(self) -> int:
+            sock = self.socket.sock
+            return sock.fileno() if sock is not None else -1
+
+        def handle_readable(self) -> None:
+            try:
+                messages = self.frames.read()
+            except (OSError, websocket.WebSocketException) as e:
+                gLogger.warning(f"EventSub reconnect connection closed: {e}")
+                self.on_closed()
+                return
+            for message in messages:
+                if message:
+                    self.on_message(message)
+
+    EventMessages = Union[BitsEvent, ChannelPointsEvent, RaidEvent, SubscriptionEvent]
     EventCallable = Callable[[EventType, EventMessages], None]
 
+    # Subscription type -> how to create it and how to dispatch its notifications
+    SUBSCRIPTIONS: Mapping[str, EventSubSubscription] = {
+        "channel.channel_points_custom_reward_redemption.add": EventSubSubscription(
+            EventType.REWARD_REDEEMED, ChannelPointsEvent, "broadcaster_user_id"
+        ),
+        "channel.subscribe": EventSubSubscription(EventType.SUBSCRIPTION, SubscriptionEvent, "broadcaster_user_id"),
+        "channel.subscription.gift": EventSubSubscription(
+            EventType.SUBSCRIPTION_GIFT, SubscriptionEvent, "broadcaster_user_id"
+        ),
+        "channel.subscription.message": EventSubSubscription(
+            EventType.SUBSCRIPTION, SubscriptionEvent, "broadcaster_user_id"
+        ),
+        "channel.cheer": EventSubSubscription(EventType.BITS, BitsEvent, "broadcaster_user_id"),
+        "channel.raid": EventSubSubscription(EventType.RAID, RaidEvent, "to_broadcaster_user_id"),
+    }
+
+    # Extra time given to a late keepalive before considering the connection dead
+    KEEPALIVE_GRACE_SECONDS = 1
+    LATENCY_SAMPLES = 20
+
     def __init__(self, broadcaster_id: str, service: Service) -> None:
         # super().__init__("ws://localhost:8080/eventsub", timeout=1)
         super().__init__("wss://eventsub-beta.wss.twitch.tv/ws", timeout=1)
@@ -38,9 +92,23 @@ class EventSub(WebSocket):
         self.service = service
         self.session_id: str | None = None
         self.has_started = False
-        # self.last_ping_time: Optional[float] = None
-        # self.nonce_waiting: MutableMapping[str, List[str]] = {}
         self.subscribers: List[EventSub.EventCallable] = []
+        self.__migration: Optional[EventSub.Migration] = None
+        self.keepalive_timeout: Optional[float] = None  # Negotiated in the welcome message
+        self.reconnects = 0
+        self.reconnect_latencies: Deque[float] = deque(maxlen=EventSub.LATENCY_SAMPLES)
+        self.__last_frame_time = time.monotonic()
+        self.__connection_lost_time: Optional[float] = None
+        self.__watchdog_timer: Optional[Reactor.Timer] = None
+        # The subscriptions are created concurrently, the receive path must not wait for the requests
+        self.__subscription_executor = ThreadPoolExecutor(
+            max_workers=len(EventSub.SUBSCRIPTIONS), thread_name_prefix="EventSubSubscription"
+        )
+        self.__message_handlers: Mapping[str, Callable[[Mapping[str, Any], Mapping[str, Any]], None]] = {
+            "session_welcome": self.__handle_welcome,
+            "session_reconnect": self.__handle_reconnect,
+            "notification": self.__handle_notification,
+        }
 
     def start(self) -> None:
         self.connect()
@@ -51,75 +119,160 @@ class EventSub(WebSocket):
             gLogger.info("Starting EventSub connection...")
             self.has_started = False
             super().connect()
-            # if self.connected:
-            #     self.ping()
-            #     self.listen(EventSubEventType.CHANNEL_POINTS_EVENT)
-            #     self.listen(EventSubEventType.SUBSCRIPTION_EVENT)
-            #     self.listen(EventSubEventType.BITS_EVENT)
-            #     self.listen(EventSubEventType.BITS_BADGE_EVENT)
+
+    def stop(self) -> None:
+        self.__cancel_watchdog()
+        self.__discard_migration()
+        self.__subscription_executor.shutdown(wait=False, cancel_futures=True)
+        super().stop()
 
     def subscribe(self, subscriber: EventCallable):
         self.subscribers.append(subscriber)
 
-    def create_subscription(self, name: str, condition: dict[str, Any], version: str = "1"):
+    def create_subscription(self, name: str, condition: dict[str, Any], version: str = "1") -> Any:
         if self.session_id is None:
-            return
-        self.service.create_eventsub_subscription(
+            return None
+        return self.service.create_eventsub_subscription(
             name, version, condition, {"method": "websocket", "session_id": self.session_id}
         )
 
-    def handle_message(self, message: str):
-        print(message)
+    def connection_closed(self) -> None:
+        self.__cancel_watchdog()
+        if self.__connection_lost_time is None:
+            self.__connection_lost_time = time.monotonic()
 
-        result = json.loads(message)
+    def get_stats(self) -> Mapping[str, Any]:
+        latencies = list(self.reconnect_latencies)
+        return {
+            "keepalive_timeout": self.keepalive_timeout,
+            "reconnects": self.reconnects,
+            "last_reconnect_latency": latencies[-1] if latencies else None,
+            "avg_reconnect_latency": sum(latencies) / len(latencies) if latencies else None,
+        }
 
+    def handle_message(self, message: str):
+        self.__last_frame_time = time.monotonic()
+        result = json.loads(message)
         metadata = result["metadata"]
-        payload = result["payload"]
+        handler = self.__message_handlers.get(metadata["message_type"])
+        if handler is not None:
+            handler(metadata, result["payload"])
 
-        if metadata["message_type"] == "session_welcome":
-            gLogger.info("EventSub connection completed")
-            self.session_id = payload["session"]["id"]
-            self.has_started = True
+    def __handle_welcome(self, metadata: Mapping[str, Any], payload: Mapping[str, Any]) -> None:
+        gLogger.info("EventSub connection completed")
+        self.session_id = payload["session"]["id"]
+        self.has_started = True
+        self.__start_watchdog(payload["session"].get("keepalive_timeout_seconds"))
+        if self.__connection_lost_time is not None:
+            self.__record_reconnect(self.__connection_lost_time)
+            self.__connection_lost_time = None
+        for name, subscription in EventSub.SUBSCRIPTIONS.items():
+            self.__subscription_executor.submit(self.__create_subscription, self.session_id, name, subscription)
 
-            self.create_subscription(
-                "channel.channel_points_custom_reward_redemption.add", {"broadcaster_user_id": self.broadcaster_id}
+    def __create_subscription(self, session_id: str, name: str, subscription: EventSubSubscription) -> None:
+        if session_id != self.session_id or not self.running:
+            return  # The session ended before reaching this subscription
+        try:
+            result = self.create_subscription(
+                name, {subscription.condition_field: self.broadcaster_id}, subscription.version
             )
-            self.create_subscription("channel.subscribe", {"broadcaster_user_id": self.broadcaster_id})
-            self.create_subscription("channel.subscription.gift", {"broadcaster_user_id": self.broadcaster_id})
-            self.create_subscription("channel.subscription.message", {"broadcaster_user_id": self.broadcaster_id})
-            self.create_subscription("channel.cheer", {"broadcaster_user_id": self.broadcaster_id})
-            self.create_subscription("channel.raid", {"to_broadcaster_user_id": self.broadcaster_id})
-        elif metadata["message_type"] == "session_keepalive":
+            if isinstance(result, dict) and "error" in result:
+                gLogger.warning(f"Error creating EventSub subscription '{name}': {result.get('message')}")
+        except Exception as e:
+            gLogger.error(f"Error creating EventSub subscription '{name}': {e}")
+
+    def __handle_reconnect(self, metadata: Mapping[str, Any], payload: Mapping[str, Any]) -> None:
+        # The subscriptions move with the session, only the connection has to change
+        reconnect_url = payload["session"]["reconnect_url"]
+        gLogger.info("EventSub reconnect requested")
+        self.reactor.run_in_executor(self.__open_migration, reconnect_url, time.monotonic())
+
+    def __open_migration(self, reconnect_url: str, start_time: float) -> None:  # Runs in a reactor worker
+        new_socket = websocket.WebSocket()
+        new_socket.settimeout(self.timeout)
+        try:
+            new_socket.connect(reconnect_url)
+            frames = FrameStream(new_socket, self.timeout)
+        except (OSError, websocket.WebSocketException) as e:
+            gLogger.error(f"Error connecting to the EventSub reconnect url: {e}")
+            return
+        migration: Optional[EventSub.Migration] = None
+
+        def on_message(message: str) -> None:
+            if migration is not None:
+                self.__handle_migration_message(migration, message)
+
+        migration = EventSub.Migration(new_socket, frames, on_message, self.__discard_migration, start_time)
+        self.__discard_migration()
+        self.__migration = migration
+        self.reactor.register(migration)
+
+    def __handle_migration_message(self, migration: "EventSub.Migration", message: str) -> None:
+        result = json.loads(message)
+        if result["metadata"]["message_type"] != "session_welcome":
+            self.handle_message(message)
+            return
+        self.reactor.unregister(migration)
+        self.__migration = None
+        self.session_id = result["payload"]["session"]["id"]
+        self.replace_socket(migration.socket, migration.frames)
+        self.__last_frame_time = time.monotonic()
+        self.__start_watchdog(result["payload"]["session"].get("keepalive_timeout_seconds"))
+        self.__record_reconnect(migration.start_time)
+
+    def __discard_migration(self) -> None:
+        migration = self.__migration
+        if migration is None:
+            return
+        self.__migration = None
+        self.reactor.unregister(migration)
+        try:
+            migration.socket.close(timeout=0)
+        except (OSError, websocket.WebSocketException):
             pass
-        elif metadata["message_type"] == "notification":
-            if payload["subscription"]["type"] == "channel.channel_points_custom_reward_redemption.add":
-                channel_point_event = ChannelPointsEvent(**payload["event"])
-                for sub in self.subscribers:
-                    sub(EventType.REWARD_REDEEMED, channel_point_event)
-
-        # if not self.has_started and result["type"] == "PONG":
-        # if result["type"] == "RESPONSE":
-        #     nonce = result["nonce"]
-        #     if result["error"] != "":
-        #         for listener in self.nonce_waiting[nonce]:
-        #             gLogger.info("Error '" + result['error'] + "' when registering listener for: {}".format(listener))
-        #     del self.nonce_waiting[nonce]
-        # if result["type"] == "MESSAGE":
-        #     data = result["data"]
-        #     if data is not None and len(data) != 0:
-        #         for sub in self.subscribers:
-        #             data_topic = data["topic"]
-        #             data_message = json.loads(data["message"])
-        #             if data_topic.startswith(EventSubEventType.CHANNEL_POINTS_EVENT.value):
-        #                 parsed_message = ChannelPointsEventMeta(**data_message)
-        #                 sub(EventType.REWARD_REDEEMED, parsed_message.data)
-        #             elif data_topic.startswith(EventSubEventType.BITS_EVENT.value):
-        #                 parsed_message = BitsEventMeta(**data_message)
-        #                 sub(EventType.BITS, parsed_message.data)
-        #             elif data_topic.startswith(EventSubEventType.SUBSCRIPTION_EVENT.value):
-        #                 parsed_message = SubscriptionEvent(**data_message)
-        #                 sub(EventType.SUBSCRIPTION, parsed_message)
-        #                 pass
-        #             elif data_topic.startswith(EventSubEventType.BITS_BADGE_EVENT.value):
-        #                 pass
-        #             gLogger.info(f"PUB_SUB {data_topic} - {json.dumps(data_message)}")
+
+    def __handle_notification(self, metadata: Mapping[str, Any], payload: Mapping[str, Any]) -> None:
+        subscription_type = payload["subscription"]["type"]
+        subscription = EventSub.SUBSCRIPTIONS.get(subscription_type)
+        if subscription is None:
+            gLogger.debug(f"Ignoring EventSub notification: {subscription_type}")
+            return
+        event = subscription.event_class(**payload["event"])
+        for sub in self.subscribers:
+            sub(subscription.event_type, event)
+
+    def __record_reconnect(self, start_time: float) -> None:
+        latency = time.monotonic() - start_time
+        self.reconnects += 1
+        self.reconnect_latencies.append(latency)
+        gLogger.info(f"EventSub reconnected in {latency:.3f}s")
+
+    def __start_watchdog(self, keepalive_timeout: Optional[float]) -> None:
+        """Forces a reconnection when no frame, keepalives included, arrives within the keepalive timeout"""
+        self.__cancel_watchdog()
+        if keepalive_timeout:
+            self.keepalive_timeout = float(keepalive_timeout)
+        if self.keepalive_timeout is None:
+            return
+        self.__schedule_watchdog(self.keepalive_timeout + EventSub.KEEPALIVE_GRACE_SECONDS)
+
+    def __schedule_watchdog(self, delay: float) -> None:
+        self.__watchdog_timer = self.reactor.call_later(delay, self.__check_keepalive)
+
+    def __check_keepalive(self) -> None:  # Runs in the reactor thread
+        self.__watchdog_timer = None
+        if self.keepalive_timeout is None or not self.running or not self.connected:
+            return
+        deadline = self.keepalive_timeout + EventSub.KEEPALIVE_GRACE_SECONDS
+        silence = time.monotonic() - self.__last_frame_time
+        if silence < deadline:
+            self.__schedule_watchdog(deadline - silence)
+            return
+        gLogger.warning(f"No EventSub frame received in {silence:.1f}s, the connection is dead")
+        self.__connection_lost_time = time.monotonic()
+        self.force_reconnect()
+
+    def __cancel_watchdog(self) -> None:
+        if self.__watchdog_timer is not None:
+            self.__watchdog_timer.cancel()
+            self.__watchdog_timer = None
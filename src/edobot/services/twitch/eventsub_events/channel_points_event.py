@@ -11,6 +11,12 @@ class ChannelPointsEvent:
             self.cost: int = kwargs["cost"]
             self.prompt: str = kwargs["prompt"]
 
+    class User:
+        def __init__(self, id: str, login: str, display_name: str) -> None:
+            self.id = id
+            self.login = login
+            self.display_name = display_name
+
     def __init__(self, **kwargs: Any) -> None:
         self.id: str = kwargs["id"]
         self.broadcaster_user_id: str = kwargs["broadcaster_user_id"]
@@ -22,4 +28,9 @@ class ChannelPointsEvent:
         self.user_input: str = kwargs["user_input"]
         self.status: str = kwargs["status"]
         self.reward: ChannelPointsEvent.Reward = ChannelPointsEvent.Reward(**kwargs["reward"])
-        self.redeemed_at: str = kwargs["id"]
+        self.redeemed_at: str = kwargs["redeemed_at"]
+        self.user = ChannelPointsEvent.User(self.user_id, self.user_login, self.user_name)
+
+    @property
+    def redemption(self) -> "ChannelPointsEvent":  # The PubSub event nests the redemption data
+        return self
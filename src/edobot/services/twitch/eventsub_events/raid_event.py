@@ -1,22 +1,29 @@
 from typing import Any
 
 
+# https://dev.twitch.tv/docs/eventsub/eventsub-subscription-types#channelraid
 class RaidEvent:
     """[summary]
 
     Attributes:
-        display_name (str):
-            Name of the channel that raided
-        login (str):
+        from_broadcaster_user_id (str):
+            ID of the channel that raided
+        from_broadcaster_user_login (str):
             The login name of the channel that raided
-        profile_image_url (str):
-            The image url of the channel that raided
-        viewer_count (int):
+        from_broadcaster_user_name (str):
+            Name of the channel that raided
+        viewers (int):
             The amount of viewers that came with the raid
     """
 
     def __init__(self, **kwargs: Any) -> None:
-        self.display_name = kwargs["msg_param_displayName"]
-        self.login = kwargs["msg_param_login"]
-        self.profile_image_url = kwargs["msg_param_profileImageURL"]
-        self.viewer_count = int(kwargs.get("msg_param_viewerCount", 0))
+        self.from_broadcaster_user_id: str = kwargs["from_broadcaster_user_id"]
+        self.from_broadcaster_user_login: str = kwargs["from_broadcaster_user_login"]
+        self.from_broadcaster_user_name: str = kwargs["from_broadcaster_user_name"]
+        self.to_broadcaster_user_id: str = kwargs.get("to_broadcaster_user_id", "")
+        self.viewers: int = int(kwargs.get("viewers", 0))
+        # Same attributes as the chat raid event
+        self.login = self.from_broadcaster_user_login
+        self.display_name = self.from_broadcaster_user_name
+        self.profile_image_url = None
+        self.viewer_count = self.viewers
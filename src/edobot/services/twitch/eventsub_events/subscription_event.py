@@ -37,3 +37,7 @@ class SubscriptionEvent:
         self.cumulative_months: int = kwargs.get("cumulative_months", 1)
         self.streak_months: int | None = kwargs.get("streak_months", 1)
         self.duration_months: int = kwargs.get("duration_months", 0)
+
+    @property
+    def sub_plan(self) -> str:  # Same name as the PubSub event
+        return self.tier
@@ -0,0 +1,83 @@
+from typing import AbstractSet, List, Mapping, MutableMapping, Optional
+
+__all__ = ["IRCMessage", "parse_irc_line", "parse_tags", "unescape_tag_value"]
+
+gTagEscapes = {":": ";", "s": " ", "\\": "\\", "r": "\r", "n": "\n"}
+
+
+class IRCMessage:
+    """IRCv3 message: [@tags] [:prefix] command [params...] [:trailing]"""
+
+    __slots__ = ("raw_tags", "prefix", "command", "params", "__tags")
+
+    def __init__(self, raw_tags: str, prefix: str, command: str, params: List[str]) -> None:
+        self.raw_tags = raw_tags
+        self.prefix = prefix
+        self.command = command
+        self.params = params
+        self.__tags: Optional[Mapping[str, str]] = None
+
+    @property
+    def tags(self) -> Mapping[str, str]:
+        """Unescaped tags, they are only split the first time they are accessed"""
+        if self.__tags is None:
+            self.__tags = parse_tags(self.raw_tags)
+        return self.__tags
+
+    @property
+    def nickname(self) -> str:
+        return self.prefix.split("!", 1)[0]
+
+
+def unescape_tag_value(value: str) -> str:
+    if "\\" not in value:
+        return value
+    result = []
+    i = 0
+    length = len(value)
+    while i < length:
+        char = value[i]
+        if char == "\\":
+            i += 1
+            if i < length:  # A trailing backslash is dropped
+                result.append(gTagEscapes.get(value[i], value[i]))
+        else:
+            result.append(char)
+        i += 1
+    return "".join(result)
+
+
+def parse_tags(raw_tags: str) -> Mapping[str, str]:
+    if not raw_tags:
+        return {}
+    unescape = "\\" in raw_tags  # Usually there is nothing to unescape
+    tags: MutableMapping[str, str] = {}
+    for key_value in raw_tags.split(";"):
+        key, _, value = key_value.partition("=")
+        tags[key] = unescape_tag_value(value) if unescape else value
+    return tags
+
+
+def parse_irc_line(line: str, ignored_commands: AbstractSet[str] = frozenset()) -> Optional[IRCMessage]:
+    """Parses a line in a single pass, returns None for empty lines and for the ignored commands.
+
+    The tags are not split until IRCMessage.tags is accessed, so ignored and tag-less lines are cheap.
+    """
+    raw_tags = ""
+    if line.startswith("@"):
+        raw_tags, _, line = line[1:].partition(" ")
+    prefix = ""
+    if line.startswith(":"):
+        prefix, _, line = line[1:].partition(" ")
+    command, _, rest = line.partition(" ")
+    if not command or command in ignored_commands:
+        return None
+
+    if rest.startswith(":"):
+        params = [rest[1:]]
+    else:
+        middle, separator, trailing = rest.partition(" :")
+        params = middle.split()
+        if separator:
+            params.append(trailing)
+    return IRCMessage(raw_tags, prefix, command, params)
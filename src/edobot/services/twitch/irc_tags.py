@@ -1,66 +1,128 @@
-from typing import Any, Optional
+from typing import List, Mapping, Optional, Tuple
 
 
 class PrivateMsgTags:
-    def __init__(
-        self,
-        badge_info: str,
-        badges: str,
-        color: str,
-        display_name: str,
-        emotes: str,
-        flags: str,
-        id: str,
-        mod: str,
-        room_id: str,
-        tmi_sent_ts: str,
-        user_id: str,
-        bits: Optional[str] = None,
-        client_nonce: Optional[str] = None,
-        emote_only: Optional[str] = None,
-        custom_reward_id: Optional[str] = None,
-        msg_id: Optional[str] = None,
-        reply_parent_display_name: Optional[str] = None,
-        reply_parent_msg_body: Optional[str] = None,
-        reply_parent_msg_id: Optional[str] = None,
-        reply_parent_user_id: Optional[str] = None,
-        reply_parent_user_login: Optional[str] = None,
-        **kwargs: Any,
-    ) -> None:
-        self.sub_months = 0
-        if badge_info:
-            self.sub_months = int(badge_info.split("/")[-1])
-        self.badges = {}
-        if badges:
-            for badge_data in badges.split(","):
-                badge, value = badge_data.split("/")
-                self.badges[badge] = value
-        self.color = color
-        self.display_name = display_name
-        self.emotes = {}
-        if emotes:
-            for emote_data in emotes.split("/"):
-                emote_id, indexes = emote_data.split(":")
-                index_list = []
-                for index in indexes.split(","):
-                    first, last = index.split("-")
-                    index_list.append((int(first), int(last)))
-                self.emotes[emote_id] = index_list
-        self.flags = flags
-        self.id = id
-        self.mod = mod == "1"
-        self.room_id = room_id
-        self.tmi_sent_ts = tmi_sent_ts
-        self.user_id = user_id
-        self.bits = bits
-        self.client_nonce = client_nonce
-        self.emote_only = emote_only
-        self.custom_reward_id = custom_reward_id
-        self.msg_id = msg_id
-        self.reply_parent_display_name = reply_parent_display_name
-        self.reply_parent_msg_body = reply_parent_msg_body
-        self.reply_parent_msg_id = reply_parent_msg_id
-        self.reply_parent_user_id = reply_parent_user_id
-        self.reply_parent_user_login = reply_parent_user_login
-        if __debug__ and kwargs:
-            print("Missing args: ", kwargs)
+    """Tags of a PRIVMSG line.
+
+    The tags are kept as received and the composite ones (badges, emotes and sub_months) are only decoded
+    the first time they are accessed, most messages never need them.
+    """
+
+    __slots__ = ("tags", "display_name", "__badges", "__emotes", "__sub_months")
+
+    def __init__(self, tags: Mapping[str, str]) -> None:
+        self.tags = tags  # IRC tag name -> unescaped value
+        self.display_name = tags.get("display-name", "")
+        self.__badges: Optional[Mapping[str, str]] = None
+        self.__emotes: Optional[Mapping[str, List[Tuple[int, int]]]] = None
+        self.__sub_months: Optional[int] = None
+
+    @property
+    def badges(self) -> Mapping[str, str]:
+        if self.__badges is None:
+            badges = {}
+            raw_badges = self.tags.get("badges")
+            if raw_badges:
+                for badge_data in raw_badges.split(","):
+                    badge, _, value = badge_data.partition("/")
+                    badges[badge] = value
+            self.__badges = badges
+        return self.__badges
+
+    def has_badge(self, badge: str) -> bool:
+        """Checks a badge without decoding all of them"""
+        if self.__badges is not None:
+            return badge in self.__badges
+        raw_badges = self.tags.get("badges")
+        return bool(raw_badges) and f",{badge}/" in f",{raw_badges}"
+
+    @property
+    def emotes(self) -> Mapping[str, List[Tuple[int, int]]]:
+        if self.__emotes is None:
+            emotes = {}
+            raw_emotes = self.tags.get("emotes")
+            if raw_emotes:
+                for emote_data in raw_emotes.split("/"):
+                    emote_id, indexes = emote_data.split(":")
+                    index_list = []
+                    for index in indexes.split(","):
+                        first, last = index.split("-")
+                        index_list.append((int(first), int(last)))
+                    emotes[emote_id] = index_list
+            self.__emotes = emotes
+        return self.__emotes
+
+    @property
+    def sub_months(self) -> int:
+        if self.__sub_months is None:
+            badge_info = self.tags.get("badge-info")
+            self.__sub_months = int(badge_info.split("/")[-1]) if badge_info else 0
+        return self.__sub_months
+
+    @property
+    def color(self) -> str:
+        return self.tags.get("color", "")
+
+    @property
+    def flags(self) -> str:
+        return self.tags.get("flags", "")
+
+    @property
+    def id(self) -> str:
+        return self.tags.get("id", "")
+
+    @property
+    def mod(self) -> bool:
+        return self.tags.get("mod") == "1"
+
+    @property
+    def room_id(self) -> str:
+        return self.tags.get("room-id", "")
+
+    @property
+    def tmi_sent_ts(self) -> str:
+        return self.tags.get("tmi-sent-ts", "")
+
+    @property
+    def user_id(self) -> str:
+        return self.tags.get("user-id", "")
+
+    @property
+    def bits(self) -> Optional[str]:
+        return self.tags.get("bits")
+
+    @property
+    def client_nonce(self) -> Optional[str]:
+        return self.tags.get("client-nonce")
+
+    @property
+    def emote_only(self) -> Optional[str]:
+        return self.tags.get("emote-only")
+
+    @property
+    def custom_reward_id(self) -> Optional[str]:
+        return self.tags.get("custom-reward-id")
+
+    @property
+    def msg_id(self) -> Optional[str]:
+        return self.tags.get("msg-id")
+
+    @property
+    def reply_parent_display_name(self) -> Optional[str]:
+        return self.tags.get("reply-parent-display-name")
+
+    @property
+    def reply_parent_msg_body(self) -> Optional[str]:
+        return self.tags.get("reply-parent-msg-body")
+
+    @property
+    def reply_parent_msg_id(self) -> Optional[str]:
+        return self.tags.get("reply-parent-msg-id")
+
+    @property
+    def reply_parent_user_id(self) -> Optional[str]:
+        return self.tags.get("reply-parent-user-id")
+
+    @property
+    def reply_parent_user_login(self) -> Optional[str]:
+        return self.tags.get("reply-parent-user-login")
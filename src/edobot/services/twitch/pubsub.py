@@ -33,6 +33,7 @@ class PubSub(WebSocket):
 
     def __init__(self, broadcaster_id: str, password: str) -> None:
         super().__init__("wss://pubsub-edge.twitch.tv", timeout=1)
+        self.ping_interval = 30
 
         self.broadcaster_id = broadcaster_id
         self.password = password
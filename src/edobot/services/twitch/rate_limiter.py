@@ -0,0 +1,90 @@
+import heapq
+import itertools
+import threading
+import time
+from typing import List, Mapping, Optional, Tuple
+
+from edobot.network.cache_request import RequestPriority
+
+__all__ = ["RateLimiter"]
+
+
+class RateLimiter:
+    """Token bucket that follows the Helix rate limit headers.
+
+    Requests wait in the bucket instead of failing when there are no points left, the waiting requests
+    are served by priority (chat path before background syncs) and then by arrival order.
+
+    https://dev.twitch.tv/docs/api/guide/#twitch-rate-limits
+    """
+
+    def __init__(self, limit: int = 800, period_seconds: float = 60) -> None:
+        self.limit = limit
+        self.period_seconds = period_seconds
+        self.tokens = float(limit)
+        self.reset_time: Optional[float] = None  # Epoch time in which the bucket is full again
+        self.throttled = 0  # Number of requests that had to wait for points
+        self.__last_refill = time.monotonic()
+        self.__closed = False
+        self.__waiting: List[Tuple[int, int]] = []
+        self.__sequence = itertools.count()
+        self.__condition = threading.Condition()
+
+    def acquire(self, priority: RequestPriority = RequestPriority.INTERACTIVE) -> None:
+        with self.__condition:
+            ticket = (int(priority), next(self.__sequence))
+            heapq.heappush(self.__waiting, ticket)
+            waited = False
+            try:
+                while not self.__closed:
+                    self.__refill()
+                    if self.__waiting[0] == ticket and self.tokens >= 1:
+                        self.tokens -= 1
+                        break
+                    waited = True
+                    self.__condition.wait(self.__time_to_next_token())
+            finally:
+                self.__waiting.remove(ticket)
+                heapq.heapify(self.__waiting)
+                self.__condition.notify_all()
+            if waited:
+                self.throttled += 1
+
+    def update(self, status_code: int, headers: Mapping[str, str]) -> None:
+        with self.__condition:
+            try:
+                if "Ratelimit-Limit" in headers:
+                    self.limit = max(1, int(headers["Ratelimit-Limit"]))
+                if "Ratelimit-Remaining" in headers:
+                    self.tokens = float(headers["Ratelimit-Remaining"])
+                if "Ratelimit-Reset" in headers:
+                    self.reset_time = float(headers["Ratelimit-Reset"])
+            except ValueError:
+                pass
+            if status_code == 429:
+                self.tokens = 0
+            self.__last_refill = time.monotonic()
+            self.__condition.notify_all()
+
+    def close(self) -> None:
+        with self.__condition:
+            self.__closed = True
+            self.__condition.notify_all()
+
+    def __refill(self) -> None:
+        now = time.monotonic()
+        elapsed = now - self.__last_refill
+        self.__last_refill = now
+        if self.reset_time is not None and time.time() >= self.reset_time:
+            self.tokens = float(self.limit)
+            self.reset_time = None
+        elif self.tokens < 1 and self.reset_time is not None:
+            return  # Twitch told us when the points are back
+        self.tokens = min(float(self.limit), self.tokens + elapsed * self.limit / self.period_seconds)
+
+    def __time_to_next_token(self) -> float:
+        if self.tokens >= 1:
+            return 1  # Waiting for a request with more priority
+        if self.reset_time is not None:
+            return max(0.01, self.reset_time - time.time())
+        return max(0.01, (1 - self.tokens) * self.period_seconds / self.limit)
@@ -1,51 +1,156 @@
+import hashlib
 import json
 import logging
+import math
+import threading
 import time
-from typing import Any, List, MutableMapping, Optional, overload
-
-import requests
+from concurrent.futures import CancelledError, Future
+from typing import Any, Callable, List, Mapping, MutableMapping, Optional, Set, Tuple, TypeVar, overload
 
 from edobot import model
 from edobot.core.constants import Constants
 from edobot.model.access_token import AccessToken
-from edobot.network.cache_request import CacheRequest
+from edobot.network.cache_request import CacheRequest, CacheRequestError, RequestPriority
+from edobot.network.http_session import HTTPSession
+from edobot.network.reconnect import Backoff
+from edobot.network.ttl_cache import TTLCache, approximate_size
+
+from .rate_limiter import RateLimiter
 
 __all__ = ["Service"]
 
 gLogger = logging.getLogger(f"edobot.{__name__}")
 
+T = TypeVar("T")
+
+
+def _login_entry_size(entry: Tuple[float, Optional[model.User]]) -> int:
+    return approximate_size(entry) + approximate_size(entry[1])
+
 
 class UnauthenticatedException(Exception):
     pass
 
 
+class UserLookupBatcher(threading.Thread):
+    """Groups the user lookups requested in a short window in the same Helix request"""
+
+    MAX_LOGINS_PER_REQUEST = 100
+
+    FetchCallable = Callable[[List[str]], MutableMapping[str, model.User]]
+
+    def __init__(self, fetch: FetchCallable, window_seconds: float = 0.05) -> None:
+        super().__init__(name=f"{self.__class__.__name__}Thread", daemon=True)
+        self.fetch = fetch
+        self.window_seconds = window_seconds
+        self.running = True
+        self.__pending: MutableMapping[str, Future[Optional[model.User]]] = {}
+        self.__condition = threading.Condition()
+
+    def lookup(self, login: str) -> "Future[Optional[model.User]]":
+        with self.__condition:
+            future = self.__pending.get(login)
+            if future is None:  # Callers asking for the same login share the same request
+                future = Future()
+                self.__pending[login] = future
+                self.__condition.notify()
+            return future
+
+    def stop(self) -> None:
+        with self.__condition:
+            self.running = False
+            for future in self.__pending.values():
+                future.cancel()
+            self.__pending.clear()
+            self.__condition.notify()
+
+    def run(self) -> None:
+        while True:
+            with self.__condition:
+                while self.running and not self.__pending:
+                    self.__condition.wait()
+                if not self.running:
+                    return
+            time.sleep(self.window_seconds)  # Wait for more lookups to arrive
+            with self.__condition:
+                logins = list(self.__pending.keys())[: UserLookupBatcher.MAX_LOGINS_PER_REQUEST]
+                batch = {login: self.__pending.pop(login) for login in logins}
+            if not batch:
+                continue
+            try:
+                users = self.fetch(logins)
+                for login, future in batch.items():
+                    future.set_result(users.get(login))
+            except Exception as e:
+                for future in batch.values():
+                    future.set_exception(e)
+
+
 class Service:
-    def __init__(self, token: AccessToken):
+    CACHE_TIMEOUT_SECONDS = 5 * 60
+    # Time an expired value is still served while it's refreshed in the background
+    CACHE_STALE_SECONDS = 5 * 60
+
+    def __init__(
+        self,
+        token: AccessToken,
+        max_cached_users: int = 10000,
+        max_cached_channels: int = 1000,
+        cache_max_bytes: Optional[int] = 16 * 1024 * 1024,
+    ):
         self.token = token
 
         self.__active = True
 
-        self.users_cache: MutableMapping[str, CacheRequest] = {}
-        self.channel_cache: MutableMapping[str, CacheRequest] = {}
+        self.rate_limiter = RateLimiter()
+
+        # The requestors expire and refresh their values themselves, so they are only evicted by size. A TTL would drop
+        # a requestor that is refreshed in the background and the next call would fetch it again synchronously
+        self.users_cache: TTLCache[str, CacheRequest] = TTLCache(
+            math.inf,
+            max_entries=16,
+            max_bytes=cache_max_bytes,
+            sizeof=CacheRequest.size,
+        )
+        # Batched lookups are not tied to a single request so the decoded users are cached instead, along with
+        # the time they are fresh until. Stale users are served while they are refreshed in the background
+        self.users_by_login: TTLCache[str, Tuple[float, Optional[model.User]]] = TTLCache(
+            Service.CACHE_TIMEOUT_SECONDS + Service.CACHE_STALE_SECONDS,
+            max_entries=max_cached_users,
+            max_bytes=cache_max_bytes,
+            sizeof=_login_entry_size,
+        )
+        self.users_lookup_lock = threading.Lock()
+        self.user_batcher: Optional[UserLookupBatcher] = None
+        self.refreshing_logins: Set[str] = set()
+        self.users_refresh_backoff = Backoff(CacheRequest.STALE_RETRY_TIME / 1000, 60)
+        self.channel_cache: TTLCache[str, CacheRequest] = TTLCache(
+            math.inf,
+            max_entries=max_cached_channels,
+            max_bytes=cache_max_bytes,
+            sizeof=CacheRequest.size,
+        )
         self.channel_editors_cache: Optional[CacheRequest] = None
 
         self.mod_requestor: Optional[CacheRequest] = None
         self.sub_requestor: Optional[CacheRequest] = None
 
-    def __call_endpoint(self, requestor: CacheRequest):
+    def __call_endpoint(self, requestor: CacheRequest[T], raise_errors: bool = False) -> T:
+        """Calls the endpoint retrying the connection errors, with raise_errors the error responses are raised"""
         retry_time = 1
         while self.__active:
             try:
-                request = requestor.call(False)
-                if request.status_code == 200:
-                    return request.json()
-                elif request.status_code == 401:
+                return requestor.call(False)
+            except CacheRequestError as e:
+                if e.status_code == 401:
                     raise UnauthenticatedException("Unauthenticated: Missing/invalid Token")
-                else:
-                    gLogger.error(f"Error reaching url '{request.url}' failed: {request.json()}")
-                    return {"data": None}
-            except UnauthenticatedException as e:
-                raise e
+                if e.status_code == 429:  # The rate limiter holds the request until the points are back
+                    gLogger.warning(f"Rate limit exceeded reaching url '{e.url}', retrying")
+                    continue
+                gLogger.error(f"Error reaching url '{e.url}' failed: {e.body}")
+                if raise_errors:
+                    raise
+                return requestor.decoder({"data": None})
             except Exception as e:
                 gLogger.error(f"Error reaching url '{requestor.url}' retying in {retry_time} seconds: {e}")
                 last_try_time = time.time()
@@ -53,23 +158,31 @@ class Service:
                     time.sleep(1)
                 retry_time *= 2
                 continue
-        return {"data": None}
+        return requestor.decoder({"data": None})
 
     def get_moderators(self) -> List[model.Moderator]:
         if self.mod_requestor is None:
             user = self.get_user()
             self.mod_requestor = self.__get_cache_requestor(
-                "GET", "/moderation/moderators", params={"broadcaster_id": user.id}
+                "GET",
+                "/moderation/moderators",
+                model.Moderator,
+                priority=RequestPriority.BACKGROUND,
+                params={"broadcaster_id": user.id},
             )
-        response = self.__call_endpoint(self.mod_requestor)
-        return [model.Moderator(**x) for x in response["data"] or []]
+        return list(self.__call_endpoint(self.mod_requestor))
 
     def get_subscribers(self) -> List[model.Suscription]:
         if self.sub_requestor is None:
             user = self.get_user()
-            self.sub_requestor = self.__get_cache_requestor("GET", "/subscriptions", params={"broadcaster_id": user.id})
-        response = self.__call_endpoint(self.sub_requestor)
-        return [model.Suscription(**x) for x in response["data"] or []]
+            self.sub_requestor = self.__get_cache_requestor(
+                "GET",
+                "/subscriptions",
+                model.Suscription,
+                priority=RequestPriority.BACKGROUND,
+                params={"broadcaster_id": user.id},
+            )
+        return list(self.__call_endpoint(self.sub_requestor))
 
     @overload
     def get_user(self) -> model.User: ...
@@ -79,43 +192,59 @@ class Service:
 
     def get_user(self, login: Optional[str] = None):
         if login is None:
-            requestor = self.users_cache.setdefault("$", self.__get_cache_requestor("GET", "/users"))
-        else:
-            requestor = self.users_cache.setdefault(
-                login, self.__get_cache_requestor("GET", "/users", params={"login": login})
-            )
-        response = self.__call_endpoint(requestor)
-        users = [model.User(**x) for x in response["data"] or []]
-        if login is None:
-            self.users_cache[users[0].login] = self.users_cache["$"]
+            requestor = self.users_cache.setdefault("$", self.__get_cache_requestor("GET", "/users", model.User))
+            users = self.__call_endpoint(requestor)
+            self.users_cache.resize("$")
+            self.users_cache.set(users[0].login, requestor)
             return users[0]
-        user = None if len(users) == 0 else users[0]
-        return user
+
+        login = login.lower()
+        requestor = self.users_cache.get(login)
+        if requestor is not None:  # Own user
+            users = self.__call_endpoint(requestor)
+            return None if len(users) == 0 else users[0]
+
+        cached = self.users_by_login.get(login)
+        if cached is not None:
+            fresh_until, user = cached
+            if time.time() > fresh_until:
+                self.__refresh_user(login, user)
+            return user
+
+        with self.users_lookup_lock:
+            if not self.__active:
+                return None
+            future = self.__get_user_batcher().lookup(login)
+        try:
+            return future.result()
+        except (CancelledError, CacheRequestError):
+            return None
 
     def get_channel(self, broadcaster_id: str) -> Optional[model.Channel]:
-        requestor = self.channel_cache.setdefault(
-            broadcaster_id, self.__get_cache_requestor("GET", "/channels", params={"broadcaster_id": broadcaster_id})
-        )
-        response = self.__call_endpoint(requestor)
-        channels = [model.Channel(**x) for x in response["data"] or []]
-        channel = None if len(channels) == 0 else channels[0]
-        return channel
+        requestor = self.channel_cache.get(broadcaster_id)
+        if requestor is None:
+            requestor = self.__get_cache_requestor(
+                "GET", "/channels", model.Channel, params={"broadcaster_id": broadcaster_id}
+            )
+            self.channel_cache.set(broadcaster_id, requestor)
+        channels = self.__call_endpoint(requestor)
+        self.channel_cache.resize(broadcaster_id)
+        return None if len(channels) == 0 else channels[0]
 
     def get_channel_editors(self) -> List[model.ChannelEditor]:
         if self.channel_editors_cache is None:
             user = self.get_user()
             self.channel_editors_cache = self.__get_cache_requestor(
-                "GET", "/channels/editors", params={"broadcaster_id": user.id}
+                "GET", "/channels/editors", model.ChannelEditor, params={"broadcaster_id": user.id}
             )
-        response = self.__call_endpoint(self.channel_editors_cache)
-        editors = [model.ChannelEditor(**x) for x in response["data"] or []]
-        return editors
+        return list(self.__call_endpoint(self.channel_editors_cache))
 
     def create_eventsub_subscription(
         self, type: str, version: str, condition: dict[str, Any], transport: dict[str, str]
     ) -> List[model.ChannelEditor]:
         data = {"type": type, "version": version, "condition": condition, "transport": transport}
-        response = requests.request(
+        self.rate_limiter.acquire(RequestPriority.INTERACTIVE)
+        response = HTTPSession.shared().request(
             "POST",
             "https://api.twitch.tv/helix" + "/eventsub/subscriptions",
             headers={
@@ -125,12 +254,149 @@ class Service:
             },
             data=json.dumps(data),
         )
+        self.rate_limiter.update(response.status_code, response.headers)
         return response.json()
 
-    def __get_cache_requestor(self, method: str, path: str, **kwargs: Any):
+    def __get_user_batcher(self) -> UserLookupBatcher:  # users_lookup_lock must be held
+        if self.user_batcher is None:
+            self.user_batcher = UserLookupBatcher(self.__fetch_users)
+            self.user_batcher.start()
+        return self.user_batcher
+
+    def __refresh_user(self, login: str, stale_user: Optional[model.User]) -> None:
+        """Refreshes a stale user in the background, only one refresh per login is in flight"""
+        with self.users_lookup_lock:
+            if not self.__active or login in self.refreshing_logins:
+                return
+            self.refreshing_logins.add(login)
+            future = self.__get_user_batcher().lookup(login)
+
+        def refreshed(future: "Future[Optional[model.User]]") -> None:
+            with self.users_lookup_lock:
+                self.refreshing_logins.discard(login)
+            if not future.cancelled() and future.exception() is None:
+                self.users_refresh_backoff.reset()
+                return
+            # Keep serving the stale user until the next attempt, the entry still expires at the same time
+            remaining_ttl = self.users_by_login.remaining_ttl(login)
+            if remaining_ttl is not None and remaining_ttl > 0:
+                retry_time = time.time() + self.users_refresh_backoff.next_delay()
+                self.users_by_login.set(login, (retry_time, stale_user), remaining_ttl)
+
+        future.add_done_callback(refreshed)
+
+    def __fetch_users(self, logins: List[str]) -> MutableMapping[str, model.User]:
+        requestor = self.__get_cache_requestor("GET", "/users", model.User, params={"login": logins})
+        users = {user.login: user for user in self.__call_endpoint(requestor, raise_errors=True)}
+        fresh_until = time.time() + Service.CACHE_TIMEOUT_SECONDS
+        for login in logins:
+            self.users_by_login.set(login, (fresh_until, users.get(login)))
+        return users
+
+    def export_cache(self) -> MutableMapping[str, Any]:
+        """JSON serializable snapshot of the cached users, channels and channel editors"""
+
+        def export_requestor(requestor: Optional[CacheRequest]) -> Optional[MutableMapping[str, Any]]:
+            if requestor is None or requestor.cached_value is None or requestor.expire_time is None:
+                return None
+            return {"expire_time": requestor.expire_time, "data": [vars(x) for x in requestor.cached_value]}
+
+        users: MutableMapping[str, Any] = {}
+        for login, (fresh_until, user) in self.users_by_login.items():
+            users[login] = {"expire_time": round(fresh_until * 1000), "data": vars(user) if user is not None else None}
+        channels: MutableMapping[str, Any] = {}
+        for broadcaster_id, requestor in self.channel_cache.items():
+            exported = export_requestor(requestor)
+            if exported is not None:
+                channels[broadcaster_id] = exported
+        return {
+            "token": self.__token_hash(),
+            "own_user": export_requestor(dict(self.users_cache.items()).get("$")),
+            "users": users,
+            "channels": channels,
+            "channel_editors": export_requestor(self.channel_editors_cache),
+        }
+
+    def import_cache(self, snapshot: Mapping[str, Any]) -> bool:
+        """Fills the caches with a snapshot created by export_cache, the entries keep their original expire time"""
+        if snapshot.get("token") != self.__token_hash():
+            return False  # The snapshot belongs to another account
+
+        current_time = round(time.time() * 1000)
+        stale_time = Service.CACHE_STALE_SECONDS * 1000
+
+        def import_requestor(entry: Optional[Mapping[str, Any]], requestor: CacheRequest) -> Optional[CacheRequest]:
+            if entry is None or entry["expire_time"] + stale_time < current_time:
+                return None
+            requestor.prime(requestor.decoder({"data": entry["data"]}), entry["expire_time"])
+            return requestor
+
+        # Everything is decoded before touching the caches, so an invalid snapshot doesn't leave them half filled
+        try:
+            own_user_requestor = import_requestor(
+                snapshot.get("own_user"), self.__get_cache_requestor("GET", "/users", model.User)
+            )
+            if own_user_requestor is None or len(own_user_requestor.cached_value or ()) == 0:
+                return False
+            own_user: model.User = own_user_requestor.cached_value[0]  # type: ignore
+
+            users: List[Tuple[str, Tuple[float, Optional[model.User]], float]] = []
+            for login, entry in snapshot.get("users", {}).items():
+                ttl_seconds = (entry["expire_time"] + stale_time - current_time) / 1000
+                if ttl_seconds > 0:  # Stale users are served and refreshed in the background
+                    user = model.User(**entry["data"]) if entry["data"] is not None else None
+                    users.append((login, (entry["expire_time"] / 1000, user), ttl_seconds))
+
+            channels: List[Tuple[str, CacheRequest]] = []
+            for broadcaster_id, entry in snapshot.get("channels", {}).items():
+                requestor = import_requestor(
+                    entry,
+                    self.__get_cache_requestor(
+                        "GET", "/channels", model.Channel, params={"broadcaster_id": broadcaster_id}
+                    ),
+                )
+                if requestor is not None:
+                    channels.append((broadcaster_id, requestor))
+
+            channel_editors_requestor = import_requestor(
+                snapshot.get("channel_editors"),
+                self.__get_cache_requestor(
+                    "GET", "/channels/editors", model.ChannelEditor, params={"broadcaster_id": own_user.id}
+                ),
+            )
+        except (KeyError, TypeError, AttributeError, ValueError) as e:
+            gLogger.warning(f"Invalid Twitch cache snapshot, ignoring it: {e}")
+            return False
+
+        self.users_cache.set("$", own_user_requestor)
+        self.users_cache.set(own_user.login, own_user_requestor)
+        for login, value, ttl_seconds in users:
+            self.users_by_login.set(login, value, ttl_seconds)
+        for broadcaster_id, requestor in channels:
+            self.channel_cache.set(broadcaster_id, requestor)
+        self.channel_editors_cache = channel_editors_requestor
+        return True
+
+    def get_cache_stats(self) -> Mapping[str, Mapping[str, int]]:
+        return {
+            "users": self.users_cache.stats(),
+            "users_by_login": self.users_by_login.stats(),
+            "channels": self.channel_cache.stats(),
+        }
+
+    def __get_cache_requestor(
+        self, method: str, path: str, model_type: Callable[..., T], **kwargs: Any
+    ) -> CacheRequest[Tuple[T, ...]]:
+        def decoder(body: Any) -> Tuple[T, ...]:
+            return tuple(model_type(**x) for x in body["data"] or [])
+
         return CacheRequest(
             method,
             "https://api.twitch.tv/helix" + path,
+            decoder,
+            timeout_seconds=Service.CACHE_TIMEOUT_SECONDS,
+            stale_seconds=Service.CACHE_STALE_SECONDS,
+            scheduler=self.rate_limiter,
             headers={
                 "Authorization": f"{self.token.token_type.title()} {self.token.access_token}",
                 "Client-Id": Constants.CLIENT_ID,
@@ -138,8 +404,16 @@ class Service:
             **kwargs,
         )
 
+    def __token_hash(self) -> str:
+        return hashlib.sha256(self.token.access_token.encode("utf-8")).hexdigest()
+
     def stop_(self):
         self.__active = False
+        self.rate_limiter.close()
+        with self.users_lookup_lock:
+            if self.user_batcher is not None:
+                self.user_batcher.stop()
+                self.user_batcher = None
 
     def __del__(self):
         self.stop_()
@@ -0,0 +1,2 @@
+# edobot.services.twitch and edobot.core import each other, the cycle only resolves when edobot.core is loaded first
+import edobot.core  # noqa: F401
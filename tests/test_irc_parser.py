@@ -0,0 +1,73 @@
+from edobot.services.twitch.irc_parser import parse_irc_line, parse_tags, unescape_tag_value
+
+
+def test_parse_tags_empty():
+    assert parse_tags("") == {}
+
+
+def test_parse_tags_simple():
+    assert parse_tags("badges=moderator/1;color=#0D4200;user-id=42") == {
+        "badges": "moderator/1",
+        "color": "#0D4200",
+        "user-id": "42",
+    }
+
+
+def test_parse_tags_empty_values():
+    assert parse_tags("badge-info=;emotes=;flags=") == {"badge-info": "", "emotes": "", "flags": ""}
+
+
+def test_parse_tags_valueless_tags():
+    assert parse_tags("a=1;flag;b=2") == {"a": "1", "flag": "", "b": "2"}
+
+
+def test_parse_tags_equals_inside_values():
+    assert parse_tags("a=1;b=2=3") == {"a": "1", "b": "2=3"}
+
+
+def test_parse_tags_valueless_tag_and_equals_inside_value():
+    assert parse_tags("a=1;flag;b=2=3") == {"a": "1", "flag": "", "b": "2=3"}
+
+
+def test_parse_tags_escapes():
+    assert parse_tags(r"system-msg=5\sraiders\sfrom\sA\:\sB;msg=a\\b\r\n") == {
+        "system-msg": "5 raiders from A; B",
+        "msg": "a\\b\r\n",
+    }
+
+
+def test_unescape_tag_value():
+    assert unescape_tag_value("plain") == "plain"
+    assert unescape_tag_value(r"a\sb\:c\\d") == "a b;c\\d"
+    assert unescape_tag_value(r"unknown\x") == "unknownx"
+    assert unescape_tag_value("trailing\\") == "trailing"
+
+
+def test_parse_privmsg():
+    message = parse_irc_line(
+        "@badges=;display-name=Viewer;user-id=1337 :viewer!viewer@viewer.tmi.twitch.tv PRIVMSG #channel :Hi :) there"
+    )
+    assert message is not None
+    assert message.command == "PRIVMSG"
+    assert message.nickname == "viewer"
+    assert message.params == ["#channel", "Hi :) there"]
+    assert message.tags == {"badges": "", "display-name": "Viewer", "user-id": "1337"}
+
+
+def test_parse_line_without_tags_or_prefix():
+    message = parse_irc_line("PING :tmi.twitch.tv")
+    assert message is not None
+    assert message.command == "PING"
+    assert message.params == ["tmi.twitch.tv"]
+    assert message.tags == {}
+
+
+def test_parse_line_params_without_trailing():
+    message = parse_irc_line(":viewer!viewer@viewer.tmi.twitch.tv JOIN #channel")
+    assert message is not None
+    assert message.params == ["#channel"]
+
+
+def test_parse_ignored_and_empty_lines():
+    assert parse_irc_line(":viewer!viewer@viewer.tmi.twitch.tv JOIN #channel", frozenset({"JOIN"})) is None
+    assert parse_irc_line("") is None